@@ -1,8 +1,9 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { 
   StyleSheet, Text, View, FlatList, ActivityIndicator, 
   StatusBar, SafeAreaView, TouchableOpacity, Alert, Modal, TextInput 
 } from 'react-native';
+import AsyncStorage from '@react-native-async-storage/async-storage';
 
 const API_BASE = 'https://sistema-libreria-er9e.onrender.com';
 
@@ -14,6 +15,44 @@ interface Producto {
   categoria?: string;
 }
 
+interface Alerta {
+  id: number;
+  nombre: string;
+  stock: number;
+}
+
+interface DeltaCatalogo {
+  version: number;
+  productos: Producto[];
+  borrados: number[];
+}
+
+// Operaciones que esperan ser enviadas a /api/sync. La clave la genera la
+// app: si el envío se corta y se reintenta, el servidor no la aplica dos veces.
+type Operacion =
+  | { clave: string; tipo: 'venta'; id: number; cantidad: number }
+  | { clave: string; tipo: 'alta'; nombre: string; precio: string; stock: string; categoria: string; stock_minimo: number };
+
+interface ResultadoSync {
+  clave: string;
+  ok: boolean;
+  nombre?: string;
+  error?: string;
+}
+
+interface RespuestaSync {
+  resultados: ResultadoSync[];
+  stock: { id: number; stock: number }[];
+}
+
+const MAX_OPERACIONES_SYNC = 500;
+const INTERVALO_REINTENTO_MS = 15000;
+// La cola se guarda en el teléfono: si la app se cierra antes de
+// sincronizar, al abrirla se manda con las mismas claves
+const CLAVE_COLA = 'colorhada.colaSync';
+
+const nuevaClave = () => `${Date.now().toString(36)}-${Math.random().toString(36).slice(2, 10)}`;
+
 export default function App() {
   const [productos, setProductos] = useState<Producto[]>([]);
   const [loading, setLoading] = useState(false);
@@ -25,11 +64,58 @@ export default function App() {
   const [stock, setStock] = useState('');
   const [categoria, setCategoria] = useState('');
 
+  // Versión del catálogo que ya tenemos: después de la primera carga solo
+  // pedimos lo que cambió (?since=) en lugar de la lista entera.
+  const versionRef = useRef<number | null>(null);
+  // Última alerta de stock bajo que ya mostramos
+  const ultimaAlertaRef = useRef<number | null>(null);
+  // Cola de operaciones sin confirmar por el servidor
+  const colaRef = useRef<Operacion[]>([]);
+  const sincronizandoRef = useRef(false);
+  const [pendientes, setPendientes] = useState(0);
+
+  // /api/sync pide sesión: si el servidor contesta 401 se pide el login
+  const [loginVisible, setLoginVisible] = useState(false);
+  const [usuario, setUsuario] = useState('');
+  const [password, setPassword] = useState('');
+
+  const revisarAlertas = async () => {
+    try {
+      const desde = ultimaAlertaRef.current;
+      const url = desde === null ? `${API_BASE}/api/alertas?limite=1` : `${API_BASE}/api/alertas?since=${desde}`;
+      const datos: { alertas: Alerta[]; ultima: number } = await (await fetch(url)).json();
+      // En la primera consulta solo tomamos la posición: no avisamos alertas viejas
+      if (desde !== null && datos.alertas.length > 0) {
+        Alert.alert("⚠️ Stock bajo", datos.alertas.map(a => `${a.nombre}: quedan ${a.stock}`).join('\n'));
+      }
+      const vistas = datos.alertas;
+      ultimaAlertaRef.current = desde === null || vistas.length === 0 ? datos.ultima : vistas[vistas.length - 1].id;
+    } catch (error) {
+      console.error("Error:", error);
+    }
+  };
+
   const obtenerProductos = async () => {
     try {
-      const respuesta = await fetch(`${API_BASE}/api/productos`);
-      const datos = await respuesta.json();
-      setProductos(datos);
+      const version = versionRef.current;
+      const url = version === null ? `${API_BASE}/api/productos` : `${API_BASE}/api/productos?since=${version}`;
+      const respuesta = await fetch(url);
+
+      if (version === null) {
+        const datos: Producto[] = await respuesta.json();
+        setProductos(datos);
+      } else {
+        const delta: DeltaCatalogo = await respuesta.json();
+        setProductos(actuales => {
+          const porId = new Map(actuales.map(p => [p.id, p]));
+          delta.borrados.forEach(id => porId.delete(id));
+          delta.productos.forEach(p => porId.set(p.id, p));
+          return Array.from(porId.values());
+        });
+      }
+      const nuevaVersion = respuesta.headers.get('X-Catalogo-Version');
+      versionRef.current = nuevaVersion ? Number(nuevaVersion) : null;
+      revisarAlertas();
     } catch (error) {
       console.error("Error:", error);
     } finally {
@@ -37,49 +123,130 @@ export default function App() {
     }
   };
 
-  const venderProducto = async (id: number) => {
-    const formData = new URLSearchParams();
-    formData.append('id', id.toString());
-    formData.append('cantidad', '1');
+  // Manda la cola en un solo pedido. Si no hay conexión o la respuesta no
+  // es la esperada, la cola queda como está y el intervalo la reintenta
+  // más tarde con las mismas claves.
+  const guardarCola = async () => {
+    try {
+      await AsyncStorage.setItem(CLAVE_COLA, JSON.stringify(colaRef.current));
+    } catch (error) {
+      console.error("No se pudo guardar la cola:", error);
+    }
+  };
 
-    await fetch(`${API_BASE}/vender`, {
-      method: 'POST',
-      headers: { 'Content-Type': 'application/x-www-form-urlencoded' },
-      body: formData.toString(),
-    });
-    obtenerProductos();
+  const cargarCola = async () => {
+    try {
+      const guardada = await AsyncStorage.getItem(CLAVE_COLA);
+      if (guardada) {
+        const anteriores: Operacion[] = JSON.parse(guardada);
+        const nuevas = colaRef.current.filter(op => !anteriores.some(a => a.clave === op.clave));
+        colaRef.current = [...anteriores, ...nuevas];
+        setPendientes(colaRef.current.length);
+      }
+    } catch (error) {
+      console.error("No se pudo leer la cola guardada:", error);
+    }
+    sincronizar();
   };
 
-  // NUEVA FUNCIÓN: Agregar producto (Igual que el formulario web)
-  const agregarProducto = async () => {
-    if (!nombre || !precio || !stock) {
-      Alert.alert("Error", "Completá los campos básicos");
-      return;
+  const sincronizar = async () => {
+    if (sincronizandoRef.current || colaRef.current.length === 0) return;
+    sincronizandoRef.current = true;
+    const lote = colaRef.current.slice(0, MAX_OPERACIONES_SYNC);
+    let enviado = false;
+    try {
+      const respuesta = await fetch(`${API_BASE}/api/sync`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        credentials: 'include',
+        body: JSON.stringify({ operaciones: lote }),
+      });
+      if (respuesta.status === 401) {
+        setLoginVisible(true);
+        return;
+      }
+      const esJson = (respuesta.headers.get('Content-Type') ?? '').includes('application/json');
+      if (!respuesta.ok || respuesta.redirected || !esJson) {
+        console.error("Respuesta inesperada de /api/sync:", respuesta.status);
+        return;
+      }
+      const datos: RespuestaSync = await respuesta.json();
+      const enviadas = new Set(lote.map(op => op.clave));
+      colaRef.current = colaRef.current.filter(op => !enviadas.has(op.clave));
+      setPendientes(colaRef.current.length);
+      await guardarCola();
+      enviado = true;
+
+      const stockPorId = new Map(datos.stock.map(p => [p.id, p.stock]));
+      setProductos(actuales => actuales.map(p => stockPorId.has(p.id) ? { ...p, stock: stockPorId.get(p.id)! } : p));
+      const rechazadas = datos.resultados.filter(r => !r.ok);
+      if (rechazadas.length > 0) {
+        Alert.alert("Operaciones rechazadas", rechazadas.map(r => `${r.nombre ?? r.clave}: ${r.error}`).join('\n'));
+      }
+      obtenerProductos();
+    } catch (error) {
+      console.error("Sin conexión, se reintenta más tarde:", error);
+    } finally {
+      sincronizandoRef.current = false;
     }
+    // Solo se sigue de inmediato si este envío salió bien (quedaron más de
+    // MAX_OPERACIONES_SYNC o se encolaron nuevas mientras tanto)
+    if (enviado && colaRef.current.length > 0) sincronizar();
+  };
 
-    const formData = new URLSearchParams();
-    formData.append('nombre', nombre);
-    formData.append('precio', precio);
-    formData.append('stock', stock);
-    formData.append('categoria', categoria);
-    formData.append('stock_minimo', '2');
+  const encolar = async (op: Operacion) => {
+    colaRef.current.push(op);
+    setPendientes(colaRef.current.length);
+    // Primero queda guardada en el teléfono, después se intenta mandar
+    await guardarCola();
+    sincronizar();
+  };
 
+  const iniciarSesion = async () => {
     try {
-      await fetch(`${API_BASE}/agregar`, {
+      const respuesta = await fetch(`${API_BASE}/api/login`, {
         method: 'POST',
-        headers: { 'Content-Type': 'application/x-www-form-urlencoded' },
-        body: formData.toString(),
+        headers: { 'Content-Type': 'application/json' },
+        credentials: 'include',
+        body: JSON.stringify({ usuario, password }),
       });
-      setModalVisible(false);
-      setNombre(''); setPrecio(''); setStock(''); setCategoria('');
-      obtenerProductos();
-      Alert.alert("Éxito", "Producto agregado correctamente");
-    } catch (e) {
-      Alert.alert("Error", "No se pudo guardar");
+      if (!respuesta.ok) {
+        Alert.alert("Error", "Usuario o contraseña incorrectos");
+        return;
+      }
+      setLoginVisible(false);
+      setPassword('');
+      sincronizar();
+    } catch (error) {
+      Alert.alert("Sin conexión", "Se va a pedir de nuevo al volver la conexión");
+      setLoginVisible(false);
     }
   };
 
-  useEffect(() => { obtenerProductos(); }, []);
+  const venderProducto = (id: number) => {
+    // Se descuenta en pantalla ya; el stock real llega con la respuesta de /api/sync
+    setProductos(actuales => actuales.map(p => p.id === id ? { ...p, stock: p.stock - 1 } : p));
+    encolar({ clave: nuevaClave(), tipo: 'venta', id, cantidad: 1 });
+  };
+
+  // NUEVA FUNCIÓN: Agregar producto (Igual que el formulario web)
+  const agregarProducto = async () => {
+    if (!nombre || !precio || !stock) {
+      Alert.alert("Error", "Completá los campos básicos");
+      return;
+    }
+
+    encolar({ clave: nuevaClave(), tipo: 'alta', nombre, precio, stock, categoria, stock_minimo: 2 });
+    setModalVisible(false);
+    setNombre(''); setPrecio(''); setStock(''); setCategoria('');
+  };
+
+  useEffect(() => {
+    obtenerProductos();
+    cargarCola();
+    const reintento = setInterval(sincronizar, INTERVALO_REINTENTO_MS);
+    return () => clearInterval(reintento);
+  }, []);
 
   return (
     <SafeAreaView style={styles.container}>
@@ -87,6 +254,7 @@ export default function App() {
       
       <View style={styles.header}>
         <Text style={styles.titulo}>ColorHada Gestión 🧚‍♀️</Text>
+        {pendientes > 0 && <Text style={styles.pendientes}>{pendientes} sin sincronizar</Text>}
       </View>
 
       <FlatList
@@ -132,6 +300,26 @@ export default function App() {
           </View>
         </View>
       </Modal>
+
+      {/* LOGIN: lo pide /api/sync para aceptar las operaciones de la cola */}
+      <Modal visible={loginVisible} animationType="slide" transparent={true}>
+        <View style={styles.modalBG}>
+          <View style={styles.modalContent}>
+            <Text style={styles.modalTitle}>Iniciar sesión</Text>
+            <TextInput placeholder="Usuario" style={styles.input} autoCapitalize="none" value={usuario} onChangeText={setUsuario} />
+            <TextInput placeholder="Contraseña" style={styles.input} secureTextEntry value={password} onChangeText={setPassword} />
+
+            <View style={{flexDirection: 'row', justifyContent: 'space-between', marginTop: 10}}>
+              <TouchableOpacity style={[styles.btnAction, {backgroundColor: '#ccc'}]} onPress={() => setLoginVisible(false)}>
+                <Text>Más tarde</Text>
+              </TouchableOpacity>
+              <TouchableOpacity style={[styles.btnAction, {backgroundColor: '#be185d'}]} onPress={iniciarSesion}>
+                <Text style={{color: '#fff'}}>Entrar</Text>
+              </TouchableOpacity>
+            </View>
+          </View>
+        </View>
+      </Modal>
     </SafeAreaView>
   );
 }
@@ -140,6 +328,7 @@ const styles = StyleSheet.create({
   container: { flex: 1, backgroundColor: '#fdf2f8' },
   header: { padding: 20, alignItems: 'center', borderBottomWidth: 1, borderBottomColor: '#fce7f3' },
   titulo: { fontSize: 22, fontWeight: 'bold', color: '#be185d' },
+  pendientes: { fontSize: 13, color: '#92400e', marginTop: 4 },
   card: { backgroundColor: '#fff', padding: 15, borderRadius: 15, marginBottom: 10, flexDirection: 'row', alignItems: 'center', elevation: 2 },
   nombre: { fontSize: 18, fontWeight: 'bold' },
   precio: { fontSize: 15, color: '#be185d', marginTop: 2 },
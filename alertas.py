@@ -0,0 +1,84 @@
+# -- ALERTAS DE STOCK BAJO --
+# Un trigger registra una alerta cada vez que el stock de un producto cruza
+# hacia abajo su stock_minimo (por una venta, una edición, una importación
+# o una sincronización). Los clientes no recorren el catálogo: piden las
+# alertas nuevas desde la última que vieron (/api/alertas?since=) o se
+# quedan escuchando el stream SSE (/api/alertas/stream).
+
+import json
+import time
+
+TABLA_ALERTAS = '''
+CREATE TABLE IF NOT EXISTS alertas (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    producto_id INTEGER NOT NULL,
+    nombre TEXT NOT NULL,
+    stock INTEGER NOT NULL,
+    stock_minimo INTEGER NOT NULL,
+    fecha TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Solo la transición (estaba bien y ahora no): vender de a uno un producto
+-- que ya estaba bajo no llena la tabla de alertas repetidas.
+CREATE TRIGGER IF NOT EXISTS trg_productos_alerta_stock AFTER UPDATE OF stock, stock_minimo ON productos
+WHEN NEW.stock <= NEW.stock_minimo AND NOT (OLD.stock <= OLD.stock_minimo) BEGIN
+    INSERT INTO alertas (producto_id, nombre, stock, stock_minimo)
+    VALUES (NEW.id, NEW.nombre, NEW.stock, NEW.stock_minimo);
+END;
+'''
+
+LIMITE_POR_DEFECTO = 50
+LIMITE_MAXIMO = 500
+
+# Cada cuánto el stream SSE mira si hay alertas nuevas (una consulta por PK)
+INTERVALO_STREAM = 1.0
+
+# Comentario vacío para que proxies y el navegador no corten la conexión
+INTERVALO_LATIDO = 15.0
+
+# El stream se cierra solo después de este tiempo: el EventSource del
+# navegador reconecta con Last-Event-ID y así no queda un hilo del worker
+# tomado para siempre.
+DURACION_STREAM = 300.0
+
+# Milisegundos que el navegador espera antes de reconectar
+REINTENTO_MS = 3000
+
+
+def ultima_id(conn):
+    return conn.execute('SELECT COALESCE(MAX(id), 0) FROM alertas').fetchone()[0]
+
+
+def alertas_desde(conn, since=None, limite=LIMITE_POR_DEFECTO):
+    """Alertas con id mayor a `since`, en orden. Sin `since`, las últimas `limite`."""
+    if since is None:
+        filas = conn.execute('SELECT * FROM (SELECT * FROM alertas ORDER BY id DESC LIMIT ?) ORDER BY id',
+                             (limite,)).fetchall()
+    else:
+        filas = conn.execute('SELECT * FROM alertas WHERE id > ? ORDER BY id LIMIT ?',
+                             (since, limite)).fetchall()
+    return [dict(f) for f in filas]
+
+
+def evento_sse(alerta):
+    return f"id: {alerta['id']}\nevent: stock_bajo\ndata: {json.dumps(alerta, ensure_ascii=False)}\n\n"
+
+
+def stream(conn, since, duracion=None):
+    """Generador de eventos SSE con las alertas posteriores a `since`."""
+    duracion = DURACION_STREAM if duracion is None else duracion
+    inicio = ultimo_envio = time.monotonic()
+    yield f'retry: {REINTENTO_MS}\n\n'
+    while True:
+        if ultima_id(conn) > since:
+            for alerta in alertas_desde(conn, since, LIMITE_MAXIMO):
+                yield evento_sse(alerta)
+                since = alerta['id']
+            ultimo_envio = time.monotonic()
+        ahora = time.monotonic()
+        if ahora - inicio >= duracion:
+            return
+        if ahora - ultimo_envio >= INTERVALO_LATIDO:
+            yield ': latido\n\n'
+            ultimo_envio = ahora
+        time.sleep(INTERVALO_STREAM)
@@ -0,0 +1,69 @@
+"""Latencia p50/p99 de la búsqueda de productos en un catálogo sintético:
+
+  * like: nombre LIKE '%termino%' ORDER BY categoria (el /buscar_precio de antes)
+  * fts:  productos_fts MATCH '"termino"*' ordenado por bm25, con LIMIT
+
+Uso:
+    python benchmarks/bench_buscador.py [--productos 200000] [--consultas 300] [--limite 20]
+"""
+import argparse
+import json
+import random
+import time
+
+import comun
+
+
+def medir(funcion, terminos):
+    tiempos = []
+    for termino in terminos:
+        t0 = time.perf_counter()
+        funcion(termino)
+        tiempos.append((time.perf_counter() - t0) * 1000)
+    return {'p50_ms': round(comun.percentil(tiempos, 50), 3),
+            'p99_ms': round(comun.percentil(tiempos, 99), 3)}
+
+
+def main_bench():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--productos', type=int, default=200_000)
+    parser.add_argument('--consultas', type=int, default=300)
+    parser.add_argument('--limite', type=int, default=20)
+    args = parser.parse_args()
+
+    ruta = comun.base_temporal()
+    main = comun.importar_app()
+    t0 = time.perf_counter()
+    comun.sembrar_productos(ruta, args.productos)
+    siembra = time.perf_counter() - t0
+
+    rnd = random.Random(3)
+    # Mezcla de lo que se tipea en el mostrador: prefijos, palabras sin
+    # acento y dos palabras
+    terminos = []
+    for _ in range(args.consultas):
+        palabra = rnd.choice(comun.PALABRAS + comun.ADJETIVOS)
+        tipo = rnd.random()
+        if tipo < 0.4:
+            terminos.append(palabra[:rnd.randint(3, len(palabra))])
+        elif tipo < 0.7:
+            terminos.append(palabra.lower().replace('á', 'a').replace('é', 'e').replace('í', 'i'))
+        else:
+            terminos.append(f'{palabra} {rnd.choice(comun.ADJETIVOS)[:4]}')
+
+    conn = main.conectar()
+    like = medir(lambda t: conn.execute('SELECT * FROM productos WHERE nombre LIKE ? ORDER BY categoria',
+                                        ('%' + t + '%',)).fetchall(), terminos)
+    fts = medir(lambda t: main.buscador.buscar_productos(conn, t, args.limite), terminos)
+
+    print(json.dumps({
+        'productos': args.productos,
+        'segundos_siembra': round(siembra, 1),
+        'like': like,
+        'fts': fts,
+        'mejora_p50': round(like['p50_ms'] / max(fts['p50_ms'], 1e-6), 1),
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main_bench()
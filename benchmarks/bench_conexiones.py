@@ -0,0 +1,118 @@
+"""Compara pedidos/segundo con tráfico mixto lectura/escritura entre:
+
+  * actual: una conexión nueva por pedido, journal en modo DELETE (lo de antes)
+  * pool:   conexión persistente por hilo en modo WAL (db.py)
+
+Uso:
+    python benchmarks/bench_conexiones.py [--hilos 8] [--segundos 5] [--productos 300]
+
+Los pedidos pasan por el test client de Flask dentro del mismo proceso, así
+que el número absoluto depende del GIL; lo que interesa es la diferencia
+entre ambos modos con el mismo código de rutas.
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+
+import comun
+
+MEZCLA = (
+    (0.55, 'GET', '/api/productos', None),
+    (0.20, 'GET', '/api/historial', None),
+    (0.20, 'POST', '/vender', 'venta'),
+    (0.05, 'POST', '/registrar_servicio', 'servicio'),
+)
+
+
+def conectar_legacy():
+    conn = sqlite3.connect(os.environ['LIBRERIA_DB_ACTIVA'])
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def preparar(main, conectar_pool, ruta, productos, modo):
+    main.conectar = conectar_pool
+    main.db.cerrar_conexion()
+    main.db.configurar_ruta(ruta)
+    main.inicializar_db()
+    main.db.cerrar_conexion()
+    ids = comun.sembrar_productos(ruta, productos, stock=(10_000, 20_000))
+    if modo == 'actual':
+        conn = sqlite3.connect(ruta)
+        conn.execute('PRAGMA journal_mode = DELETE')
+        conn.close()
+        os.environ['LIBRERIA_DB_ACTIVA'] = ruta
+        main.conectar = conectar_legacy
+    return ids
+
+
+def trabajador(main, ids, fin, contadores, errores, semilla):
+    rnd = random.Random(semilla)
+    cliente = main.app.test_client()
+    hechos = fallidos = 0
+    while time.perf_counter() < fin:
+        r = rnd.random()
+        acumulado = 0
+        for peso, metodo, url, tipo in MEZCLA:
+            acumulado += peso
+            if r <= acumulado:
+                break
+        if tipo == 'venta':
+            resp = cliente.post(url, data={'id': rnd.choice(ids), 'cantidad': 1})
+        elif tipo == 'servicio':
+            resp = cliente.post(url, data={'tipo_servicio': 'Fotocopia B/N', 'monto': 50})
+        else:
+            resp = cliente.get(url)
+        if resp.status_code >= 500:
+            fallidos += 1
+        else:
+            hechos += 1
+    contadores.append(hechos)
+    errores.append(fallidos)
+    main.db.cerrar_conexion()
+
+
+def correr(main, ids, hilos, segundos):
+    contadores, errores = [], []
+    fin = time.perf_counter() + segundos
+    inicio = time.perf_counter()
+    ts = [threading.Thread(target=trabajador, args=(main, ids, fin, contadores, errores, i))
+          for i in range(hilos)]
+    for t in ts:
+        t.start()
+    for t in ts:
+        t.join()
+    duracion = time.perf_counter() - inicio
+    return {'pedidos': sum(contadores), 'errores': sum(errores),
+            'pedidos_por_segundo': round(sum(contadores) / duracion, 1)}
+
+
+def main_bench():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--hilos', type=int, default=8)
+    parser.add_argument('--segundos', type=float, default=5)
+    parser.add_argument('--productos', type=int, default=300)
+    args = parser.parse_args()
+
+    ruta_base = comun.base_temporal()
+    main = comun.importar_app()
+    main.app.logger.disabled = True
+
+    conectar_pool = main.conectar
+    resultados = {}
+    for modo in ('actual', 'pool'):
+        ruta = ruta_base.replace('.db', f'_{modo}.db')
+        ids = preparar(main, conectar_pool, ruta, args.productos, modo)
+        resultados[modo] = correr(main, ids, args.hilos, args.segundos)
+
+    resultados['mejora'] = round(resultados['pool']['pedidos_por_segundo'] /
+                                 max(resultados['actual']['pedidos_por_segundo'], 0.1), 2)
+    print(json.dumps(resultados, indent=2))
+
+
+if __name__ == '__main__':
+    main_bench()
@@ -0,0 +1,105 @@
+"""Latencia de la consulta diaria del historial sobre un año de ventas sintéticas.
+
+  * antes:   WHERE date(fecha) = ? + sum() en Python (recorre la tabla entera)
+  * despues: WHERE fecha >= ? AND fecha < ? + SUM() en SQL (usa idx_*_fecha)
+
+Uso:
+    python benchmarks/bench_historial.py [--ventas 2000000] [--servicios 500000] [--repeticiones 20]
+"""
+import argparse
+import json
+import random
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+import comun
+
+INICIO = datetime(2025, 1, 1)
+
+
+def sembrar(ruta, ventas, servicios, semilla=7):
+    rnd = random.Random(semilla)
+    segundos_anio = 365 * 24 * 3600
+    conn = sqlite3.connect(ruta)
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.execute('PRAGMA synchronous = OFF')
+
+    def fecha():
+        return (INICIO + timedelta(seconds=rnd.randrange(segundos_anio))).strftime('%Y-%m-%d %H:%M:%S')
+
+    lote = 100_000
+    for desde in range(0, ventas, lote):
+        conn.executemany('INSERT INTO ventas (producto_nombre, cantidad, monto_total, fecha) VALUES (?, ?, ?, ?)',
+                         ((comun.nombre_producto(i, rnd), c, c * 350.0, fecha())
+                          for i in range(desde, min(desde + lote, ventas)) for c in (rnd.randint(1, 4),)))
+        conn.commit()
+    for desde in range(0, servicios, lote):
+        conn.executemany('INSERT INTO servicios (tipo, monto, fecha) VALUES (?, ?, ?)',
+                         (('Fotocopia B/N', 50.0, fecha()) for _ in range(desde, min(desde + lote, servicios))))
+        conn.commit()
+    conn.close()
+
+
+def consulta_antes(conn, dia):
+    ventas = conn.execute('SELECT * FROM ventas WHERE date(fecha) = ?', (dia,)).fetchall()
+    servicios = conn.execute('SELECT * FROM servicios WHERE date(fecha) = ?', (dia,)).fetchall()
+    return sum(v['monto_total'] for v in ventas) + sum(s['monto'] for s in servicios)
+
+
+def consulta_despues(main, conn, dia):
+    rango = main.rango_del_dia(dia)
+    conn.execute('SELECT * FROM ventas WHERE fecha >= ? AND fecha < ?', rango).fetchall()
+    conn.execute('SELECT * FROM servicios WHERE fecha >= ? AND fecha < ?', rango).fetchall()
+    total_v, total_s = conn.execute('''
+        SELECT (SELECT COALESCE(SUM(monto_total), 0) FROM ventas WHERE fecha >= ?1 AND fecha < ?2),
+               (SELECT COALESCE(SUM(monto), 0) FROM servicios WHERE fecha >= ?1 AND fecha < ?2)
+    ''', rango).fetchone()
+    return total_v + total_s
+
+
+def medir(funcion, dias):
+    tiempos = []
+    resultados = []
+    for dia in dias:
+        t0 = time.perf_counter()
+        resultados.append(funcion(dia))
+        tiempos.append((time.perf_counter() - t0) * 1000)
+    return resultados, {'p50_ms': round(comun.percentil(tiempos, 50), 3),
+                        'p99_ms': round(comun.percentil(tiempos, 99), 3)}
+
+
+def main_bench():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--ventas', type=int, default=2_000_000)
+    parser.add_argument('--servicios', type=int, default=500_000)
+    parser.add_argument('--repeticiones', type=int, default=20)
+    args = parser.parse_args()
+
+    ruta = comun.base_temporal()
+    main = comun.importar_app()
+    t0 = time.perf_counter()
+    sembrar(ruta, args.ventas, args.servicios)
+    siembra = time.perf_counter() - t0
+
+    conn = main.conectar()
+    conn.execute('ANALYZE')
+    rnd = random.Random(1)
+    dias = [(INICIO + timedelta(days=rnd.randrange(365))).strftime('%Y-%m-%d') for _ in range(args.repeticiones)]
+
+    totales_antes, antes = medir(lambda d: consulta_antes(conn, d), dias)
+    totales_despues, despues = medir(lambda d: consulta_despues(main, conn, d), dias)
+
+    print(json.dumps({
+        'filas_ventas': args.ventas,
+        'filas_servicios': args.servicios,
+        'segundos_siembra': round(siembra, 1),
+        'antes': antes,
+        'despues': despues,
+        'mismos_totales': all(abs(a - b) < 1e-6 for a, b in zip(totales_antes, totales_despues)),
+        'mejora_p50': round(antes['p50_ms'] / max(despues['p50_ms'], 1e-6), 1),
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main_bench()
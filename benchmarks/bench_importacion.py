@@ -0,0 +1,70 @@
+"""Filas/segundo de la importación y exportación masiva del catálogo.
+
+Genera un CSV sintético (1M filas por defecto), lo sube a
+/api/productos/importar como flujo (sin cargarlo en memoria) y después
+descarga el catálogo completo por /api/productos/exportar en CSV y NDJSON.
+
+Uso:
+    python benchmarks/bench_importacion.py [--filas 1000000]
+"""
+import argparse
+import csv
+import json
+import os
+import random
+import resource
+import time
+
+import comun
+
+
+def generar_csv(ruta, filas, semilla=11):
+    rnd = random.Random(semilla)
+    with open(ruta, 'w', newline='', encoding='utf-8') as f:
+        escritor = csv.writer(f)
+        escritor.writerow(['nombre', 'categoria', 'stock', 'precio', 'stock_minimo'])
+        for i in range(filas):
+            escritor.writerow([comun.nombre_producto(i, rnd), rnd.choice(comun.CATEGORIAS),
+                               rnd.randint(0, 500), round(rnd.uniform(50, 20000), 2), rnd.randint(0, 10)])
+
+
+def main_bench():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--filas', type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    ruta_db = comun.base_temporal()
+    main = comun.importar_app()
+    ruta_csv = os.path.join(os.path.dirname(ruta_db), 'catalogo.csv')
+    generar_csv(ruta_csv, args.filas)
+    cliente = main.app.test_client()
+
+    t0 = time.perf_counter()
+    with open(ruta_csv, 'rb') as f:
+        resp = cliente.post('/api/productos/importar', data=f, content_type='text/csv')
+    segundos_importar = time.perf_counter() - t0
+    resumen = resp.get_json()
+
+    exportaciones = {}
+    for formato in ('csv', 'ndjson'):
+        t0 = time.perf_counter()
+        resp = cliente.get(f'/api/productos/exportar?formato={formato}', buffered=False)
+        total_bytes = sum(len(parte) for parte in resp.response)
+        resp.close()
+        segundos = time.perf_counter() - t0
+        exportaciones[formato] = {'segundos': round(segundos, 1), 'megabytes': round(total_bytes / 2**20, 1),
+                                  'filas_por_segundo': round(args.filas / segundos)}
+
+    print(json.dumps({
+        'filas': args.filas,
+        'megabytes_csv': round(os.path.getsize(ruta_csv) / 2**20, 1),
+        'importar': {'segundos': round(segundos_importar, 1), 'importadas': resumen['importadas'],
+                     'con_error': resumen['con_error'],
+                     'filas_por_segundo': round(args.filas / segundos_importar)},
+        'exportar': exportaciones,
+        'memoria_max_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main_bench()
@@ -0,0 +1,77 @@
+"""Latencia de la página principal (/) con catálogos de distinto tamaño.
+
+  * antes:        consulta, agrupa y renderiza todas las secciones en cada visita
+                  (se simula descartando la caché antes de cada pedido y sin
+                  carga diferida)
+  * cache:        vista y secciones ya cacheadas (visitas sin escrituras entre medio)
+  * tras_venta:   después de una venta, que cambia la versión del catálogo y
+                  obliga a re-renderizar solo la sección afectada
+
+Uso:
+    python benchmarks/bench_inventario.py [--tamanios 1000,10000,100000] [--repeticiones 10]
+"""
+import argparse
+import json
+import random
+import time
+
+import comun
+
+
+def medir(cliente, repeticiones, antes_de_cada=None):
+    tiempos = []
+    for _ in range(repeticiones):
+        if antes_de_cada:
+            antes_de_cada()
+        t0 = time.perf_counter()
+        resp = cliente.get('/')
+        resp.get_data()
+        tiempos.append((time.perf_counter() - t0) * 1000)
+    return {'p50_ms': round(comun.percentil(tiempos, 50), 2),
+            'p99_ms': round(comun.percentil(tiempos, 99), 2)}
+
+
+def main_bench():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tamanios', default='1000,10000,100000')
+    parser.add_argument('--repeticiones', type=int, default=10)
+    args = parser.parse_args()
+
+    ruta_base = comun.base_temporal()
+    main = comun.importar_app()
+    inventario = main.inventario
+    limite_original = inventario.LIMITE_CARGA_COMPLETA
+    rnd = random.Random(5)
+
+    resultados = {}
+    for tamanio in [int(t) for t in args.tamanios.split(',')]:
+        ruta = ruta_base.replace('.db', f'_{tamanio}.db')
+        main.db.cerrar_conexion()
+        main.db.configurar_ruta(ruta)
+        main.inicializar_db()
+        ids = comun.sembrar_productos(ruta, tamanio, stock=(10, 1000))
+        cliente = main.app.test_client()
+        cliente.get('/')  # consume las alertas de stock bajo de la sesión
+
+        # Antes: todo desde cero en cada visita y todas las secciones abiertas
+        inventario.LIMITE_CARGA_COMPLETA = float('inf')
+        antes = medir(cliente, min(args.repeticiones, 5), inventario.invalidar)
+        inventario.LIMITE_CARGA_COMPLETA = limite_original
+        inventario.invalidar()
+        cliente.get('/')
+
+        cache = medir(cliente, args.repeticiones)
+        conn = main.conectar()
+        tras_venta = medir(cliente, args.repeticiones,
+                           lambda: main.ventas.vender_producto(conn, rnd.choice(ids), 1))
+
+        resultados[tamanio] = {
+            'carga_diferida': tamanio > limite_original,
+            'antes': antes, 'cache': cache, 'tras_venta': tras_venta,
+        }
+
+    print(json.dumps(resultados, indent=2))
+
+
+if __name__ == '__main__':
+    main_bench()
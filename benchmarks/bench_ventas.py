@@ -0,0 +1,82 @@
+"""Prueba de estrés del motor de ventas: muchos hilos cobrando carritos
+contra los mismos productos vía /api/ventas/lote.
+
+Informa checkouts/segundo y verifica al final que ningún stock quedó
+negativo y que lo vendido coincide con lo descontado.
+
+Uso:
+    python benchmarks/bench_ventas.py [--hilos 16] [--segundos 5] [--productos 5] [--lineas 15]
+"""
+import argparse
+import json
+import random
+import threading
+import time
+
+import comun
+
+
+def cajero(main, ids, lineas, fin, stats, semilla):
+    rnd = random.Random(semilla)
+    cliente = main.app.test_client()
+    checkouts = lineas_ok = rechazadas = errores = 0
+    while time.perf_counter() < fin:
+        carrito = [{'id': rnd.choice(ids), 'cantidad': rnd.randint(1, 3)} for _ in range(lineas)]
+        resp = cliente.post('/api/ventas/lote', json={'items': carrito})
+        if resp.status_code != 200:
+            errores += 1
+            continue
+        checkouts += 1
+        for r in resp.get_json()['resultados']:
+            if r['ok']:
+                lineas_ok += 1
+            else:
+                rechazadas += 1
+    stats.append((checkouts, lineas_ok, rechazadas, errores))
+    main.db.cerrar_conexion()
+
+
+def main_bench():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--hilos', type=int, default=16)
+    parser.add_argument('--segundos', type=float, default=5)
+    parser.add_argument('--productos', type=int, default=5)
+    parser.add_argument('--lineas', type=int, default=15)
+    parser.add_argument('--stock', type=int, default=20_000)
+    args = parser.parse_args()
+
+    ruta = comun.base_temporal()
+    main = comun.importar_app()
+    ids = comun.sembrar_productos(ruta, args.productos, stock=(args.stock, args.stock))
+
+    stats = []
+    fin = time.perf_counter() + args.segundos
+    inicio = time.perf_counter()
+    hilos = [threading.Thread(target=cajero, args=(main, ids, args.lineas, fin, stats, i))
+             for i in range(args.hilos)]
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+    duracion = time.perf_counter() - inicio
+
+    conn = main.conectar()
+    stock_min = conn.execute('SELECT MIN(stock) FROM productos').fetchone()[0]
+    descontado = args.stock * args.productos - conn.execute('SELECT SUM(stock) FROM productos').fetchone()[0]
+    vendido = conn.execute('SELECT COALESCE(SUM(cantidad), 0) FROM ventas').fetchone()[0]
+
+    checkouts = sum(s[0] for s in stats)
+    print(json.dumps({
+        'hilos': args.hilos,
+        'checkouts': checkouts,
+        'checkouts_por_segundo': round(checkouts / duracion, 1),
+        'lineas_vendidas': sum(s[1] for s in stats),
+        'lineas_rechazadas': sum(s[2] for s in stats),
+        'errores_http': sum(s[3] for s in stats),
+        'stock_minimo_final': stock_min,
+        'stock_consistente': stock_min >= 0 and descontado == vendido,
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main_bench()
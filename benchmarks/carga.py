@@ -0,0 +1,353 @@
+"""Prueba de carga de la app real bajo gunicorn, con varias combinaciones de workers e hilos.
+
+Siembra una base temporal con un catálogo y un historial de ventas
+sintéticos y, para cada configuración, levanta gunicorn sobre una copia
+de esa base. Varios usuarios simulados inician sesión y recorren una
+mezcla de rutas reales: /, /vender, /buscar_precio, /historial y
+/api/productos (esta última con sincronización delta, como la app móvil).
+
+Por cada configuración informa en JSON:
+  * pedidos por segundo y latencias p50/p95/p99 (total y por ruta)
+  * errores HTTP (5xx), pedidos que perdieron la sesión y fallas de conexión
+  * errores "database is locked" de SQLite: la suma de
+    libreria_sqlite_bloqueos_total de cada worker (/metrics) y las veces
+    que aparecen en el log de gunicorn
+
+El JSON se puede guardar (--salida) y comparar entre versiones para
+detectar regresiones.
+
+Uso:
+    python benchmarks/carga.py [--configuraciones 1x1,2x4,4x4] [--usuarios 16] [--segundos 15]
+                               [--productos 5000] [--ventas 200000] [--dias 90] [--salida carga.json]
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import re
+import shutil
+import signal
+import socket
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode
+
+import comun
+
+USUARIO = 'carga'
+PASSWORD = 'carga'
+
+# Peso de cada ruta en la mezcla de tráfico
+MEZCLA_POR_DEFECTO = 'index=30,vender=20,buscar=20,historial=10,api=20'
+
+TIEMPO_ARRANQUE = 30.0
+
+# Scrapeos de /metrics por worker: cada conexión nueva la atiende el worker
+# que la acepte primero, así que se repite hasta haberlos visto a todos
+SCRAPEOS_POR_WORKER = 20
+
+_RE_BLOQUEOS = re.compile(r'^libreria_sqlite_bloqueos_total (\d+)$', re.M)
+_RE_PID = re.compile(r'^libreria_proceso_info\{pid="(\d+)"\}', re.M)
+
+
+def parsear_configuraciones(texto):
+    configuraciones = []
+    for parte in texto.split(','):
+        workers, _, hilos = parte.strip().partition('x')
+        configuraciones.append((int(workers), int(hilos or 1)))
+    return configuraciones
+
+
+def parsear_mezcla(texto):
+    mezcla = {}
+    for parte in texto.split(','):
+        ruta, _, peso = parte.strip().partition('=')
+        if ruta not in ACCIONES:
+            raise SystemExit(f'Ruta desconocida en --mezcla: {ruta} (opciones: {", ".join(ACCIONES)})')
+        mezcla[ruta] = float(peso)
+    return mezcla
+
+
+def puerto_libre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+# --- BASE ---
+
+def preparar_base(args):
+    """Crea la base sembrada que después se copia para cada configuración."""
+    ruta = comun.base_temporal('carga.db')
+    comun.importar_app()  # crea el esquema y corre las migraciones
+    ids = comun.sembrar_productos(ruta, args.productos, stock=(10_000, 50_000))
+    comun.sembrar_ventas(ruta, args.ventas, args.servicios, args.dias)
+    conn = sqlite3.connect(ruta)
+    conn.execute('INSERT OR IGNORE INTO usuarios (username, password) VALUES (?, ?)', (USUARIO, PASSWORD))
+    conn.commit()
+    conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    conn.close()
+    return ruta, ids
+
+
+# --- SERVIDOR ---
+
+class Servidor:
+    def __init__(self, ruta_db, workers, hilos, puerto, directorio):
+        self.puerto = puerto
+        self.log = os.path.join(directorio, f'gunicorn_{workers}x{hilos}.log')
+        env = dict(os.environ, LIBRERIA_DB=ruta_db)
+        env.pop('SERVER_TIMING', None)
+        self.proceso = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '--workers', str(workers), '--threads', str(hilos),
+             '--bind', f'127.0.0.1:{puerto}', '--error-logfile', self.log, 'main:app'],
+            cwd=comun.RAIZ, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    def esperar(self):
+        limite = time.monotonic() + TIEMPO_ARRANQUE
+        while time.monotonic() < limite:
+            if self.proceso.poll() is not None:
+                raise RuntimeError(f'gunicorn terminó al arrancar (ver {self.log})')
+            try:
+                conn = http.client.HTTPConnection('127.0.0.1', self.puerto, timeout=2)
+                conn.request('GET', '/login')
+                conn.getresponse().read()
+                conn.close()
+                return
+            except OSError:
+                time.sleep(0.1)
+        raise RuntimeError(f'gunicorn no respondió en {TIEMPO_ARRANQUE:.0f} s')
+
+    def bloqueos(self, workers):
+        """Suma libreria_sqlite_bloqueos_total de cada worker distinto que responda."""
+        por_pid = {}
+        for _ in range(workers * SCRAPEOS_POR_WORKER):
+            conn = http.client.HTTPConnection('127.0.0.1', self.puerto, timeout=5)
+            try:
+                conn.request('GET', '/metrics', headers={'Connection': 'close'})
+                texto = conn.getresponse().read().decode()
+            except OSError:
+                continue
+            finally:
+                conn.close()
+            pid, total = _RE_PID.search(texto), _RE_BLOQUEOS.search(texto)
+            if pid and total:
+                por_pid[pid.group(1)] = max(por_pid.get(pid.group(1), 0), int(total.group(1)))
+            if len(por_pid) >= workers:
+                break
+        return sum(por_pid.values()), len(por_pid)
+
+    def bloqueos_en_log(self):
+        try:
+            with open(self.log, encoding='utf-8', errors='replace') as f:
+                return f.read().count('database is locked')
+        except FileNotFoundError:
+            return 0
+
+    def detener(self):
+        self.proceso.send_signal(signal.SIGTERM)
+        try:
+            self.proceso.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            self.proceso.kill()
+            self.proceso.wait()
+
+
+# --- USUARIOS SIMULADOS ---
+
+class Sesion:
+    """Conexión keep-alive con la cookie de sesión de Flask."""
+
+    def __init__(self, puerto):
+        self.conn = http.client.HTTPConnection('127.0.0.1', puerto, timeout=30)
+        self.cookies = {}
+
+    def pedir(self, metodo, ruta, datos=None):
+        headers = {'Accept-Encoding': 'gzip'}
+        cuerpo = None
+        if datos is not None:
+            cuerpo = urlencode(datos)
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        if self.cookies:
+            headers['Cookie'] = '; '.join(f'{k}={v}' for k, v in self.cookies.items())
+        try:
+            self.conn.request(metodo, ruta, body=cuerpo, headers=headers)
+            resp = self.conn.getresponse()
+            resp.read()
+        except (OSError, http.client.HTTPException):
+            # La próxima request() reabre la conexión
+            self.conn.close()
+            raise
+        for valor in resp.headers.get_all('Set-Cookie') or []:
+            for nombre, morsel in SimpleCookie(valor).items():
+                self.cookies[nombre] = morsel.value
+        return resp
+
+    def iniciar_sesion(self):
+        resp = self.pedir('POST', '/login', {'usuario': USUARIO, 'password': PASSWORD})
+        if resp.status != 302 or '/login' in (resp.getheader('Location') or ''):
+            raise RuntimeError(f'No se pudo iniciar sesión (status {resp.status})')
+
+
+def _index(sesion, estado, rnd):
+    return sesion.pedir('GET', '/')
+
+
+def _vender(sesion, estado, rnd):
+    return sesion.pedir('POST', '/vender', {'id': rnd.choice(estado['ids']), 'cantidad': rnd.randint(1, 3)})
+
+
+def _buscar(sesion, estado, rnd):
+    termino = rnd.choice(comun.PALABRAS)
+    if rnd.random() < 0.5:
+        termino = termino[:rnd.randint(2, len(termino))]  # búsqueda mientras se escribe
+    return sesion.pedir('POST', '/buscar_precio', {'busqueda': termino})
+
+
+def _historial(sesion, estado, rnd):
+    return sesion.pedir('GET', '/historial')
+
+
+def _api(sesion, estado, rnd):
+    ruta = '/api/productos'
+    if estado.get('version') is not None:
+        ruta += f"?since={estado['version']}"
+    resp = sesion.pedir('GET', ruta)
+    if resp.status == 200 and resp.getheader('X-Catalogo-Version'):
+        estado['version'] = resp.getheader('X-Catalogo-Version')
+    return resp
+
+
+ACCIONES = {'index': _index, 'vender': _vender, 'buscar': _buscar, 'historial': _historial, 'api': _api}
+
+
+def _perdio_sesion(accion, resp):
+    destino = resp.getheader('Location') or ''
+    return resp.status in (301, 302) and '/login' in destino and accion != 'login'
+
+
+def usuario(puerto, ids, mezcla, inicio_medicion, fin, muestras, semilla):
+    rnd = random.Random(semilla)
+    acciones = list(mezcla)
+    pesos = [mezcla[a] for a in acciones]
+    sesion = Sesion(puerto)
+    propias = []
+    try:
+        sesion.iniciar_sesion()
+    except (OSError, http.client.HTTPException, RuntimeError):
+        muestras.append([('login', 0.0, 'conexion')])
+        return
+    estado = {'ids': ids, 'version': None}
+    while True:
+        ahora = time.perf_counter()
+        if ahora >= fin:
+            break
+        accion = rnd.choices(acciones, pesos)[0]
+        t0 = time.perf_counter()
+        try:
+            resp = ACCIONES[accion](sesion, estado, rnd)
+            resultado = resp.status
+            if resultado >= 500:
+                resultado = 'http_5xx'
+            elif _perdio_sesion(accion, resp):
+                resultado = 'sin_sesion'
+                sesion.iniciar_sesion()
+        except (OSError, http.client.HTTPException, RuntimeError):
+            resultado = 'conexion'
+        if t0 >= inicio_medicion:
+            propias.append((accion, time.perf_counter() - t0, resultado))
+    sesion.conn.close()
+    muestras.append(propias)
+
+
+# --- INFORME ---
+
+def _resumen(latencias, segundos):
+    ms = [s * 1000 for s in latencias]
+    return {'pedidos': len(ms),
+            'pedidos_por_segundo': round(len(ms) / segundos, 1) if segundos else 0.0,
+            'p50_ms': round(comun.percentil(ms, 50), 2),
+            'p95_ms': round(comun.percentil(ms, 95), 2),
+            'p99_ms': round(comun.percentil(ms, 99), 2)}
+
+
+def informe(muestras, segundos):
+    todas = [m for propias in muestras for m in propias]
+    ok = [m for m in todas if isinstance(m[2], int)]
+    errores = {}
+    for _, _, resultado in todas:
+        if not isinstance(resultado, int):
+            errores[resultado] = errores.get(resultado, 0) + 1
+    rutas = {}
+    for accion in sorted({m[0] for m in ok}):
+        rutas[accion] = _resumen([m[1] for m in ok if m[0] == accion], segundos)
+    return dict(_resumen([m[1] for m in ok], segundos), errores=errores, rutas=rutas)
+
+
+def correr_configuracion(args, ruta_base, ids, mezcla, workers, hilos):
+    directorio = os.path.dirname(ruta_base)
+    ruta_db = os.path.join(directorio, f'carga_{workers}x{hilos}.db')
+    shutil.copyfile(ruta_base, ruta_db)  # cada configuración arranca con los mismos datos
+    servidor = Servidor(ruta_db, workers, hilos, puerto_libre(), directorio)
+    try:
+        servidor.esperar()
+        muestras = []
+        inicio_medicion = time.perf_counter() + args.calentamiento
+        fin = inicio_medicion + args.segundos
+        usuarios = [threading.Thread(target=usuario,
+                                     args=(servidor.puerto, ids, mezcla, inicio_medicion, fin, muestras, i))
+                    for i in range(args.usuarios)]
+        for u in usuarios:
+            u.start()
+        for u in usuarios:
+            u.join()
+        bloqueos, workers_vistos = servidor.bloqueos(workers)
+    finally:
+        servidor.detener()
+    resultado = {'workers': workers, 'hilos': hilos}
+    resultado.update(informe(muestras, args.segundos))
+    resultado['bloqueos_sqlite'] = {'metricas': bloqueos, 'workers_scrapeados': workers_vistos,
+                                   'log_gunicorn': servidor.bloqueos_en_log()}
+    return resultado
+
+
+def main_bench():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--configuraciones', default='1x1,2x4,4x4',
+                        help='workers x hilos de gunicorn, separadas por coma')
+    parser.add_argument('--usuarios', type=int, default=16, help='usuarios simulados en paralelo')
+    parser.add_argument('--segundos', type=float, default=15, help='duración de la medición')
+    parser.add_argument('--calentamiento', type=float, default=2, help='segundos iniciales que no se miden')
+    parser.add_argument('--productos', type=int, default=5000)
+    parser.add_argument('--ventas', type=int, default=200_000)
+    parser.add_argument('--servicios', type=int, default=20_000)
+    parser.add_argument('--dias', type=int, default=90, help='días que abarca el historial sembrado')
+    parser.add_argument('--mezcla', default=MEZCLA_POR_DEFECTO, help='peso de cada ruta: index, vender, '
+                                                                     'buscar, historial, api')
+    parser.add_argument('--salida', help='además de imprimirlo, guardar el JSON en este archivo')
+    args = parser.parse_args()
+
+    mezcla = parsear_mezcla(args.mezcla)
+    configuraciones = parsear_configuraciones(args.configuraciones)
+    ruta_base, ids = preparar_base(args)
+
+    resultados = [correr_configuracion(args, ruta_base, ids, mezcla, w, h) for w, h in configuraciones]
+    salida = {
+        'parametros': {'usuarios': args.usuarios, 'segundos': args.segundos, 'productos': args.productos,
+                       'ventas': args.ventas, 'servicios': args.servicios, 'dias': args.dias, 'mezcla': mezcla},
+        'resultados': resultados,
+    }
+    texto = json.dumps(salida, indent=2, ensure_ascii=False)
+    print(texto)
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as f:
+            f.write(texto + '\n')
+
+
+if __name__ == '__main__':
+    main_bench()
@@ -0,0 +1,86 @@
+# -- UTILIDADES COMPARTIDAS POR LOS BENCHMARKS --
+# Los benchmarks nunca tocan libreria.db: cada uno trabaja sobre una base
+# temporal que se elige ANTES de importar main (main inicializa la base al
+# importarse).
+
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+RAIZ = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if RAIZ not in sys.path:
+    sys.path.insert(0, RAIZ)
+
+CATEGORIAS = ['Bazar', 'Colegio', 'Oficina', 'Regalería', 'Juguetería', 'Arte', 'Papelería', 'Tecnología']
+PALABRAS = ['Lápiz', 'Cuaderno', 'Goma', 'Regla', 'Mochila', 'Carpeta', 'Témpera', 'Pincel',
+            'Marcador', 'Resaltador', 'Tijera', 'Compás', 'Agenda', 'Taza', 'Mate', 'Vaso',
+            'Cartuchera', 'Sacapuntas', 'Plasticola', 'Cinta', 'Abrochadora', 'Block', 'Sobre', 'Lapicera']
+ADJETIVOS = ['Rojo', 'Azul', 'Verde', 'Negro', 'Pastel', 'Escolar', 'Premium', 'Mini', 'Grande',
+             'Rayado', 'Cuadriculado', 'Térmico', 'Metálico', 'Ecológico', 'Infantil', 'Fluo']
+
+
+def base_temporal(nombre='bench.db'):
+    """Crea un directorio temporal y apunta LIBRERIA_DB a un archivo dentro."""
+    directorio = tempfile.mkdtemp(prefix='libreria_bench_')
+    ruta = os.path.join(directorio, nombre)
+    os.environ['LIBRERIA_DB'] = ruta
+    return ruta
+
+
+def importar_app():
+    """Importa main con la base temporal ya configurada y sin login."""
+    import main
+    main.app.config['TESTING'] = True
+    main.app.config['LOGIN_DISABLED'] = True
+    return main
+
+
+def nombre_producto(i, rnd=random):
+    return f"{rnd.choice(PALABRAS)} {rnd.choice(ADJETIVOS)} {i}"
+
+
+def sembrar_productos(ruta, cantidad, semilla=1234, stock=(0, 200)):
+    """Inserta `cantidad` productos sintéticos y devuelve la lista de ids."""
+    rnd = random.Random(semilla)
+    conn = sqlite3.connect(ruta)
+    filas = ((nombre_producto(i, rnd), rnd.randint(*stock), rnd.randint(0, 10),
+              round(rnd.uniform(100, 25000), 2), rnd.choice(CATEGORIAS))
+             for i in range(cantidad))
+    conn.executemany('INSERT INTO productos (nombre, stock, stock_minimo, precio, categoria) '
+                     'VALUES (?, ?, ?, ?, ?)', filas)
+    conn.commit()
+    ids = [r[0] for r in conn.execute('SELECT id FROM productos')]
+    conn.close()
+    return ids
+
+
+def sembrar_ventas(ruta, ventas, servicios=0, dias=90, semilla=7):
+    """Inserta un historial de ventas y servicios repartido en los últimos `dias` (hoy incluido)."""
+    rnd = random.Random(semilla)
+    conn = sqlite3.connect(ruta)
+    nombres = [r[0] for r in conn.execute('SELECT nombre FROM productos LIMIT 5000')] or ['Lápiz']
+    desde = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=dias - 1)
+    segundos = int((datetime.now() - desde).total_seconds()) or 1
+
+    def fecha():
+        return (desde + timedelta(seconds=rnd.randrange(segundos))).strftime('%Y-%m-%d %H:%M:%S')
+
+    conn.executemany('INSERT INTO ventas (producto_nombre, cantidad, monto_total, fecha) VALUES (?, ?, ?, ?)',
+                     ((rnd.choice(nombres), c, c * round(rnd.uniform(100, 25000), 2), fecha())
+                      for _ in range(ventas) for c in (rnd.randint(1, 4),)))
+    conn.executemany('INSERT INTO servicios (tipo, monto, fecha) VALUES (?, ?, ?)',
+                     ((rnd.choice(['Fotocopia B/N', 'Impresión color', 'Anillado']), 50.0, fecha())
+                      for _ in range(servicios)))
+    conn.commit()
+    conn.close()
+
+
+def percentil(valores, p):
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    k = min(len(ordenados) - 1, max(0, int(round(p / 100 * (len(ordenados) - 1)))))
+    return ordenados[k]
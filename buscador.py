@@ -0,0 +1,69 @@
+# -- BÚSQUEDA DE PRODUCTOS (FTS5) --
+# productos_fts es un índice de texto completo sobre nombre y categoría de
+# productos. No duplica los datos (content='productos'): solo guarda el
+# índice, que mantienen los triggers de abajo. El tokenizer quita acentos
+# ("lapiz" encuentra "Lápiz") y los índices de prefijo hacen rápidas las
+# búsquedas mientras se escribe ("cuad" encuentra "Cuaderno").
+
+import re
+
+TABLA_FTS = '''
+CREATE VIRTUAL TABLE IF NOT EXISTS productos_fts USING fts5(
+    nombre, categoria,
+    content = 'productos', content_rowid = 'id',
+    tokenize = 'unicode61 remove_diacritics 2',
+    prefix = '2 3'
+);
+
+CREATE TRIGGER IF NOT EXISTS trg_productos_fts_alta AFTER INSERT ON productos BEGIN
+    INSERT INTO productos_fts (rowid, nombre, categoria) VALUES (NEW.id, NEW.nombre, NEW.categoria);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_productos_fts_baja AFTER DELETE ON productos BEGIN
+    INSERT INTO productos_fts (productos_fts, rowid, nombre, categoria)
+    VALUES ('delete', OLD.id, OLD.nombre, OLD.categoria);
+END;
+
+-- Solo cambios de nombre o categoría: las ventas (stock) no tocan el índice
+CREATE TRIGGER IF NOT EXISTS trg_productos_fts_cambio AFTER UPDATE OF nombre, categoria ON productos BEGIN
+    INSERT INTO productos_fts (productos_fts, rowid, nombre, categoria)
+    VALUES ('delete', OLD.id, OLD.nombre, OLD.categoria);
+    INSERT INTO productos_fts (rowid, nombre, categoria) VALUES (NEW.id, NEW.nombre, NEW.categoria);
+END;
+'''
+
+# El nombre pesa más que la categoría al ordenar por relevancia
+PESO_NOMBRE = 10.0
+PESO_CATEGORIA = 1.0
+
+LIMITE_API = 20
+LIMITE_MAXIMO = 200
+
+
+def consulta_fts(texto):
+    """Arma la expresión MATCH: cada palabra como prefijo, todas obligatorias.
+
+    Las palabras van entre comillas para que nada de lo que escriba el usuario
+    se interprete como sintaxis de FTS5 (AND, OR, NEAR, *, -...).
+    """
+    palabras = re.findall(r'\w+', texto)
+    return ' '.join(f'"{p}"*' for p in palabras)
+
+
+def buscar_productos(conn, texto, limite=None):
+    """Productos que coinciden con `texto`, los más relevantes primero.
+
+    Sin palabras para buscar devuelve todo el catálogo por categoría, igual
+    que el LIKE '%%' de antes.
+    """
+    consulta = consulta_fts(texto)
+    if not consulta:
+        return conn.execute('SELECT * FROM productos ORDER BY categoria LIMIT ?',
+                            (limite if limite else -1,)).fetchall()
+    return conn.execute(f'''
+        SELECT p.* FROM productos_fts
+        JOIN productos p ON p.id = productos_fts.rowid
+        WHERE productos_fts MATCH ?
+        ORDER BY bm25(productos_fts, {PESO_NOMBRE}, {PESO_CATEGORIA})
+        LIMIT ?
+    ''', (consulta, limite if limite else -1)).fetchall()
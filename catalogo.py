@@ -0,0 +1,168 @@
+# -- CATÁLOGO VERSIONADO PARA /api/productos --
+# catalogo_version tiene un único contador que suben los triggers de
+# productos en cada alta, cambio (incluido el stock de una venta) o baja.
+# Cada producto guarda la versión de su último cambio y las bajas quedan en
+# productos_borrados. Con eso:
+#   * el ETag sale del contador, sin serializar nada (304 casi gratis),
+#   * ?since=<version> devuelve solo lo que cambió y los ids borrados,
+#   * las respuestas ya serializadas (y comprimidas) se guardan en memoria
+#     por versión: cuando el contador cambia, la caché se descarta.
+# Como el contador vive en la base, la invalidación vale para todos los
+# workers de gunicorn, no solo para el que hizo la escritura.
+
+import gzip
+import hashlib
+import threading
+
+try:
+    import brotli
+except ImportError:  # brotli es opcional: sin él se ofrece solo gzip
+    brotli = None
+
+TABLAS_VERSION = '''
+CREATE TABLE IF NOT EXISTS catalogo_version (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    version INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS productos_borrados (
+    id INTEGER PRIMARY KEY,
+    version INTEGER NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_productos_borrados_version ON productos_borrados(version);
+
+CREATE INDEX IF NOT EXISTS idx_productos_version ON productos(version);
+
+CREATE TRIGGER IF NOT EXISTS trg_productos_version_alta AFTER INSERT ON productos BEGIN
+    UPDATE catalogo_version SET version = version + 1 WHERE id = 1;
+    UPDATE productos SET version = (SELECT version FROM catalogo_version WHERE id = 1) WHERE id = NEW.id;
+    DELETE FROM productos_borrados WHERE id = NEW.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_productos_version_cambio
+AFTER UPDATE OF nombre, categoria, stock, stock_minimo, precio ON productos BEGIN
+    UPDATE catalogo_version SET version = version + 1 WHERE id = 1;
+    UPDATE productos SET version = (SELECT version FROM catalogo_version WHERE id = 1) WHERE id = NEW.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_productos_version_baja AFTER DELETE ON productos BEGIN
+    UPDATE catalogo_version SET version = version + 1 WHERE id = 1;
+    INSERT OR REPLACE INTO productos_borrados (id, version)
+    VALUES (OLD.id, (SELECT version FROM catalogo_version WHERE id = 1));
+END;
+'''
+
+LIMITE_MAXIMO = 1000
+
+# Por debajo de esto comprimir no ahorra nada que valga la pena
+MIN_BYTES_COMPRIMIR = 1024
+
+MAX_ENTRADAS_CACHE = 64
+
+
+def version_actual(conn):
+    return conn.execute('SELECT version FROM catalogo_version WHERE id = 1').fetchone()[0]
+
+
+def parsear_parametros(args):
+    """Lee ?since=, ?limit= y ?cursor=. Devuelve una tupla (sirve de clave de caché)."""
+    since = args.get('since')
+    limite = args.get('limit')
+    cursor = args.get('cursor')
+    since = int(since) if since not in (None, '') else None
+    limite = int(limite) if limite not in (None, '') else None
+    cursor = int(cursor) if cursor not in (None, '') else 0
+    if limite is not None and not 1 <= limite <= LIMITE_MAXIMO:
+        raise ValueError(f'limit debe estar entre 1 y {LIMITE_MAXIMO}')
+    if (since is not None and since < 0) or cursor < 0:
+        raise ValueError('since y cursor no pueden ser negativos')
+    return since, limite, cursor
+
+
+def armar_respuesta(conn, version, since, limite, cursor):
+    """Datos a devolver según el modo.
+
+    Sin parámetros devuelve la lista de productos como siempre (la app
+    vieja espera eso). Con ``limit``/``cursor`` o ``since`` devuelve un
+    objeto con la versión, los productos, y ``siguiente_cursor`` /
+    ``borrados`` según corresponda.
+    """
+    condiciones = ['id > ?']
+    valores = [cursor]
+    if since is not None:
+        condiciones.append('version > ?')
+        valores.append(since)
+    sql = f"SELECT * FROM productos WHERE {' AND '.join(condiciones)} ORDER BY id"
+    if limite is not None:
+        sql += ' LIMIT ?'
+        valores.append(limite + 1)
+    productos = [dict(p) for p in conn.execute(sql, valores)]
+
+    if since is None and limite is None and not cursor:
+        return productos
+
+    siguiente = None
+    if limite is not None and len(productos) > limite:
+        productos = productos[:limite]
+        siguiente = productos[-1]['id']
+    datos = {'version': version, 'productos': productos, 'siguiente_cursor': siguiente}
+    if since is not None:
+        # Los borrados van solo en la primera página del delta
+        datos['borrados'] = [] if cursor else [
+            b['id'] for b in conn.execute('SELECT id FROM productos_borrados WHERE version > ? ORDER BY id', (since,))]
+    return datos
+
+
+def elegir_codificacion(accept_encodings):
+    """'br', 'gzip' o None según lo que acepte el cliente (y lo instalado)."""
+    if brotli is not None and accept_encodings['br']:
+        return 'br'
+    if accept_encodings['gzip']:
+        return 'gzip'
+    return None
+
+
+def codificar(cuerpo, codificacion):
+    """Comprime el cuerpo si conviene. Devuelve (bytes, codificación usada)."""
+    if codificacion is None or len(cuerpo) < MIN_BYTES_COMPRIMIR:
+        return cuerpo, None
+    if codificacion == 'br':
+        return brotli.compress(cuerpo, quality=5), 'br'
+    return gzip.compress(cuerpo, compresslevel=6, mtime=0), 'gzip'
+
+
+def etag(version, clave):
+    """ETag fuerte: distinto por versión, parámetros y codificación."""
+    resumen = hashlib.blake2s(repr(clave).encode(), digest_size=6).hexdigest()
+    return f'c{version}-{resumen}'
+
+
+class CacheRespuestas:
+    """Respuestas ya serializadas de la versión vigente del catálogo."""
+
+    def __init__(self, max_entradas=MAX_ENTRADAS_CACHE):
+        self.max_entradas = max_entradas
+        self._lock = threading.Lock()
+        self._version = None
+        self._entradas = {}
+
+    def obtener(self, version, clave):
+        with self._lock:
+            if version != self._version:
+                return None
+            return self._entradas.get(clave)
+
+    def guardar(self, version, clave, valor):
+        with self._lock:
+            if self._version is not None and version < self._version:
+                return  # un hilo lento con datos viejos no pisa la caché nueva
+            if version != self._version:
+                self._version = version
+                self._entradas = {}
+            if len(self._entradas) >= self.max_entradas:
+                self._entradas.pop(next(iter(self._entradas)))
+            self._entradas[clave] = valor
+
+
+cache = CacheRespuestas()
@@ -0,0 +1,135 @@
+# -- CAPA DE CONEXIONES A SQLITE --
+# Cada hilo de cada worker mantiene UNA conexión abierta a libreria.db y la
+# reutiliza entre pedidos. Así evitamos abrir el archivo, leer el esquema y
+# aplicar los PRAGMA en cada request, y el modo WAL deja que las lecturas
+# (/, /api/productos) sigan mientras otro hilo escribe (/vender, /agregar).
+
+import os
+import sqlite3
+import threading
+import time
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+
+# Se puede apuntar a otra base (tests, benchmarks) con la variable LIBRERIA_DB
+RUTA_DB = os.environ.get('LIBRERIA_DB', os.path.join(BASE_DIR, 'libreria.db'))
+
+# Milisegundos que un escritor espera el lock antes de dar "database is locked"
+BUSY_TIMEOUT_MS = 5000
+
+# Cantidad de sentencias preparadas que sqlite3 guarda por conexión
+SENTENCIAS_CACHEADAS = 256
+
+# Rango de un INTEGER de SQLite: un int de Python fuera de esto no se puede
+# pasar como parámetro (OverflowError)
+ENTERO_MINIMO = -2 ** 63
+ENTERO_MAXIMO = 2 ** 63 - 1
+
+PRAGMAS = (
+    'PRAGMA journal_mode = WAL',
+    # Con WAL, NORMAL es seguro ante cortes de la app (solo se puede perder
+    # la última transacción si se cae el sistema operativo).
+    'PRAGMA synchronous = NORMAL',
+    'PRAGMA cache_size = -16000',      # ~16 MB de caché de páginas
+    'PRAGMA mmap_size = 134217728',    # 128 MB mapeados en memoria
+    'PRAGMA temp_store = MEMORY',
+    'PRAGMA foreign_keys = ON',
+    f'PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}',
+)
+
+_local = threading.local()
+
+# Función (sql, segundos, error) que se llama después de cada execute; la
+# instala metricas.init_app(). None = sin instrumentación.
+observador = None
+
+
+class ConexionPersistente(sqlite3.Connection):
+    """Conexión que sobrevive al pedido.
+
+    Las rutas siguen llamando a ``conn.close()`` como siempre; acá eso solo
+    descarta una transacción que haya quedado abierta y deja la conexión
+    lista para el próximo pedido del mismo hilo. Para cerrarla de verdad
+    está ``cerrar()``.
+    """
+
+    def close(self):
+        if self.in_transaction:
+            self.rollback()
+
+    def execute(self, sql, *args):
+        if observador is None:
+            return super().execute(sql, *args)
+        return self._medir(super().execute, sql, args)
+
+    def executemany(self, sql, *args):
+        if observador is None:
+            return super().executemany(sql, *args)
+        return self._medir(super().executemany, sql, args)
+
+    def _medir(self, ejecutar, sql, args):
+        # Se mide el execute (que ya trae la primera fila); lo que tarde
+        # recorrer el resto de un SELECT largo no entra en la cuenta.
+        error = None
+        inicio = time.perf_counter()
+        try:
+            return ejecutar(sql, *args)
+        except sqlite3.Error as e:
+            error = e
+            raise
+        finally:
+            observador(sql, time.perf_counter() - inicio, error)
+
+    def cerrar(self):
+        super().close()
+
+
+def abrir_conexion(ruta=None):
+    """Abre una conexión nueva con los PRAGMA de rendimiento aplicados."""
+    conn = sqlite3.connect(
+        ruta or RUTA_DB,
+        timeout=BUSY_TIMEOUT_MS / 1000,
+        factory=ConexionPersistente,
+        cached_statements=SENTENCIAS_CACHEADAS,
+    )
+    conn.row_factory = sqlite3.Row
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+def obtener_conexion():
+    """Devuelve la conexión del hilo actual, abriéndola la primera vez."""
+    conn = getattr(_local, 'conn', None)
+    if conn is None or _local.ruta != RUTA_DB:
+        if conn is not None:
+            conn.cerrar()
+        conn = abrir_conexion(RUTA_DB)
+        _local.conn = conn
+        _local.ruta = RUTA_DB
+    return conn
+
+
+def liberar_conexion(exc=None):
+    """Teardown del app context: deja la conexión del hilo sin transacciones colgadas."""
+    conn = getattr(_local, 'conn', None)
+    if conn is not None:
+        conn.close()
+
+
+def cerrar_conexion():
+    """Cierra de verdad la conexión del hilo actual (tests, fin de worker)."""
+    conn = getattr(_local, 'conn', None)
+    if conn is not None:
+        conn.cerrar()
+        _local.conn = None
+
+
+def configurar_ruta(ruta):
+    """Cambia la base de datos en uso; cada hilo reconecta en su próximo pedido."""
+    global RUTA_DB
+    RUTA_DB = ruta
+
+
+def init_app(app):
+    app.teardown_appcontext(liberar_conexion)
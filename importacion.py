@@ -0,0 +1,279 @@
+# -- IMPORTACIÓN Y EXPORTACIÓN MASIVA DEL CATÁLOGO --
+# Las importaciones leen el archivo de a pedazos (CSV, NDJSON o una lista
+# JSON), validan fila por fila y graban en bloques de FILAS_POR_BLOQUE con
+# executemany, una transacción por bloque: nunca se tiene el archivo entero
+# en memoria. Las filas con `id` actualizan ese producto (o lo crean con ese
+# id); las que no lo traen se agregan como productos nuevos.
+# Las exportaciones recorren el catálogo por páginas de id y devuelven un
+# generador, para que Flask las mande a medida que se producen.
+
+import csv
+import io
+import json
+import math
+import sqlite3
+
+import db
+
+COLUMNAS = ('id', 'nombre', 'categoria', 'stock', 'precio', 'stock_minimo')
+
+FORMATOS = ('csv', 'ndjson', 'json')
+
+FILAS_POR_BLOQUE = 5000
+
+# Errores que se devuelven con detalle; el resto solo se cuentan
+MAX_ERRORES_DETALLE = 100
+
+TAM_LECTURA = 64 * 1024
+
+# Un objeto de una lista JSON no puede ocupar más que esto sin cerrarse
+MAX_TAM_OBJETO = 1024 * 1024
+
+_UPSERT = '''
+    INSERT INTO productos (id, nombre, categoria, stock, precio, stock_minimo) VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT (id) DO UPDATE SET
+        nombre = excluded.nombre, categoria = excluded.categoria, stock = excluded.stock,
+        precio = excluded.precio, stock_minimo = excluded.stock_minimo
+'''
+_INSERT = 'INSERT INTO productos (nombre, categoria, stock, precio, stock_minimo) VALUES (?, ?, ?, ?, ?)'
+
+
+def formato_desde(nombre_archivo=None, content_type=None):
+    """Adivina el formato por la extensión del archivo o el Content-Type."""
+    nombre_archivo = (nombre_archivo or '').lower()
+    content_type = (content_type or '').lower()
+    if nombre_archivo.endswith(('.ndjson', '.jsonl')) or 'ndjson' in content_type:
+        return 'ndjson'
+    if nombre_archivo.endswith('.json') or 'json' in content_type:
+        return 'json'
+    return 'csv'
+
+
+# --- LECTURA INCREMENTAL ---
+
+def _filas_csv(texto):
+    lector = csv.DictReader(texto)
+    if not lector.fieldnames or 'nombre' not in lector.fieldnames:
+        raise ValueError('El CSV necesita una fila de encabezado con al menos la columna "nombre"')
+    # La línea 1 es el encabezado
+    for numero, fila in enumerate(lector, start=2):
+        yield numero, fila
+
+
+def _filas_ndjson(texto):
+    for numero, linea in enumerate(texto, start=1):
+        if not linea.strip():
+            continue
+        try:
+            yield numero, json.loads(linea)
+        except json.JSONDecodeError as e:
+            yield numero, ValueError(f'JSON inválido: {e.msg}')
+
+
+def _filas_json(texto):
+    """Recorre una lista JSON ``[{...}, {...}]`` sin cargarla entera."""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    abierta = False
+    numero = 0
+    while True:
+        bloque = texto.read(TAM_LECTURA)
+        buffer += bloque
+        pos = 0
+        while True:
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+                pos += 1
+            if pos >= len(buffer):
+                break
+            if not abierta:
+                if buffer[pos] != '[':
+                    raise ValueError('Se esperaba una lista JSON')
+                abierta = True
+                pos += 1
+                continue
+            if buffer[pos] == ']':
+                return
+            try:
+                objeto, pos_nueva = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if not bloque or len(buffer) - pos > MAX_TAM_OBJETO:
+                    raise ValueError(f'JSON inválido cerca del elemento {numero + 1}')
+                break  # el objeto sigue en el próximo bloque
+            numero += 1
+            yield numero, objeto
+            pos = pos_nueva
+        buffer = buffer[pos:]
+        if not bloque:
+            raise ValueError('La lista JSON no está cerrada')
+
+
+def leer_filas(flujo, formato):
+    """Genera ``(número, fila)`` desde un flujo binario. `fila` puede ser una excepción."""
+    texto = io.TextIOWrapper(flujo, encoding='utf-8-sig', newline='')
+    if formato == 'ndjson':
+        return _filas_ndjson(texto)
+    if formato == 'json':
+        return _filas_json(texto)
+    return _filas_csv(texto)
+
+
+# --- VALIDACIÓN ---
+
+def _vacio(valor):
+    return valor is None or (isinstance(valor, str) and not valor.strip())
+
+
+def validar_fila(fila):
+    """Convierte una fila cruda en la tupla de COLUMNAS. Lanza ValueError si no sirve."""
+    if isinstance(fila, Exception):
+        raise fila
+    if not isinstance(fila, dict):
+        raise ValueError('Cada fila tiene que ser un objeto')
+    nombre = fila.get('nombre')
+    if _vacio(nombre):
+        raise ValueError('Falta el nombre')
+    try:
+        id_prod = None if _vacio(fila.get('id')) else int(fila['id'])
+        stock = int(fila.get('stock') or 0)
+        precio = float(fila.get('precio') or 0)
+        stock_minimo = int(fila.get('stock_minimo') or 0)
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError('id, stock, precio y stock_minimo tienen que ser números')
+    if stock < 0 or precio < 0 or stock_minimo < 0:
+        raise ValueError('stock, precio y stock_minimo no pueden ser negativos')
+    # Enteros que no entran en un INTEGER de SQLite romperían el bloque entero
+    enteros = [n for n in (id_prod, stock, stock_minimo) if n is not None]
+    if any(not db.ENTERO_MINIMO <= n <= db.ENTERO_MAXIMO for n in enteros) or not math.isfinite(precio):
+        raise ValueError('id, stock, precio o stock_minimo fuera de rango')
+    categoria = fila.get('categoria')
+    categoria = 'General' if _vacio(categoria) else str(categoria).strip()
+    return id_prod, str(nombre).strip(), categoria, stock, precio, stock_minimo
+
+
+# --- GRABACIÓN ---
+
+class ResultadoImportacion:
+    def __init__(self):
+        self.procesadas = 0
+        self.importadas = 0
+        self.con_error = 0
+        self.errores = []
+        # Error que cortó la lectura del archivo (JSON sin cerrar, UTF-8
+        # inválido...). Lo grabado antes de ese punto queda grabado.
+        self.error_fatal = None
+
+    def error(self, numero, mensaje):
+        self.con_error += 1
+        if len(self.errores) < MAX_ERRORES_DETALLE:
+            self.errores.append({'fila': numero, 'error': mensaje})
+
+    def como_dict(self):
+        return {'procesadas': self.procesadas, 'importadas': self.importadas,
+                'con_error': self.con_error, 'errores': self.errores, 'error_fatal': self.error_fatal}
+
+
+def _grabar_bloque(conn, bloque, resultado):
+    con_id = [fila for _, fila in bloque if fila[0] is not None]
+    sin_id = [fila[1:] for _, fila in bloque if fila[0] is None]
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        if con_id:
+            conn.executemany(_UPSERT, con_id)
+        if sin_id:
+            conn.executemany(_INSERT, sin_id)
+        conn.commit()
+        resultado.importadas += len(bloque)
+        return
+    except sqlite3.DatabaseError:
+        conn.rollback()
+
+    # Algo del bloque rompió una restricción: lo repetimos fila por fila
+    # para grabar las buenas e informar cuál falló
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        for numero, fila in bloque:
+            try:
+                if fila[0] is not None:
+                    conn.execute(_UPSERT, fila)
+                else:
+                    conn.execute(_INSERT, fila[1:])
+                resultado.importadas += 1
+            except sqlite3.DatabaseError as e:
+                resultado.error(numero, str(e))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def importar(conn, filas, por_bloque=FILAS_POR_BLOQUE, al_avanzar=None):
+    """Valida y graba las filas de `leer_filas()` en bloques.
+
+    `al_avanzar`, si se pasa, se llama con el resultado parcial después de
+    cada bloque (lo usa el comando de consola para mostrar el progreso).
+    Si el archivo se rompe a mitad de camino, se graban las filas válidas
+    leídas hasta ahí y el motivo queda en ``error_fatal``: los bloques
+    anteriores ya están confirmados y el cliente tiene que saber cuántos.
+    """
+    resultado = ResultadoImportacion()
+    bloque = []
+    filas = iter(filas)
+    while True:
+        try:
+            numero, cruda = next(filas)
+        except StopIteration:
+            break
+        except (ValueError, csv.Error) as e:  # ValueError incluye UnicodeDecodeError
+            resultado.error_fatal = str(e)
+            break
+        resultado.procesadas += 1
+        try:
+            bloque.append((numero, validar_fila(cruda)))
+        except ValueError as e:
+            resultado.error(numero, str(e))
+            continue
+        if len(bloque) >= por_bloque:
+            _grabar_bloque(conn, bloque, resultado)
+            bloque = []
+            if al_avanzar:
+                al_avanzar(resultado)
+    if bloque:
+        _grabar_bloque(conn, bloque, resultado)
+        if al_avanzar:
+            al_avanzar(resultado)
+    return resultado
+
+
+# --- EXPORTACIÓN ---
+
+def _paginas_productos(conn, por_pagina):
+    conn.execute('BEGIN')  # toda la exportación ve la misma foto del catálogo
+    try:
+        ultimo = 0
+        while True:
+            filas = conn.execute(f"SELECT {', '.join(COLUMNAS)} FROM productos WHERE id > ? ORDER BY id LIMIT ?",
+                                 (ultimo, por_pagina)).fetchall()
+            if not filas:
+                return
+            yield filas
+            ultimo = filas[-1]['id']
+    finally:
+        conn.commit()
+
+
+def exportar(conn, formato='csv', por_pagina=FILAS_POR_BLOQUE):
+    """Genera el catálogo como texto CSV o NDJSON, de a una página por vez."""
+    if formato == 'ndjson':
+        for filas in _paginas_productos(conn, por_pagina):
+            yield ''.join(json.dumps(dict(f), ensure_ascii=False) + '\n' for f in filas)
+        return
+    salida = io.StringIO()
+    escritor = csv.writer(salida)
+    escritor.writerow(COLUMNAS)
+    for filas in _paginas_productos(conn, por_pagina):
+        escritor.writerows(filas)
+        yield salida.getvalue()
+        salida.seek(0)
+        salida.truncate()
+    if salida.tell():
+        yield salida.getvalue()
@@ -0,0 +1,186 @@
+# -- VISTA DEL INVENTARIO (página principal) --
+# index() ya no consulta, agrupa y renderiza todo el catálogo en cada visita:
+#   * la vista (productos agrupados por categoría + lista de stock bajo) se
+#     arma una vez por versión del catálogo (ver catalogo.py) y se reutiliza;
+#   * la tabla de cada categoría se renderiza una vez y se guarda mientras
+#     esa categoría no cambie: una venta solo vuelve a renderizar su sección;
+#   * con catálogos grandes las secciones se mandan cerradas y se cargan de
+#     a páginas (/inventario/seccion) cuando el usuario las abre.
+
+import threading
+
+from flask import get_template_attribute
+from markupsafe import Markup
+
+import catalogo
+
+INDICES = '''
+CREATE INDEX IF NOT EXISTS idx_productos_categoria ON productos(categoria);
+
+-- Índice parcial: solo contiene los productos con stock bajo, así la lista
+-- de alertas no recorre el catálogo entero.
+CREATE INDEX IF NOT EXISTS idx_productos_stock_bajo ON productos(stock) WHERE stock <= stock_minimo;
+'''
+
+# Hasta esta cantidad de productos la página trae todas las secciones
+# abiertas; por encima, cada sección se carga al abrirla.
+LIMITE_CARGA_COMPLETA = 1000
+
+# Productos por página al cargar una sección de a partes
+PRODUCTOS_POR_PAGINA = 200
+
+PLANTILLA_MACROS = '_inventario.html'
+
+# Si cambiaron más productos que esto desde la última vista, conviene
+# releer todo en lugar de parchear
+MAX_CAMBIOS_INCREMENTALES = 500
+
+
+def _orden_categoria(cat):
+    # Mismo orden que ORDER BY categoria en SQLite: NULL primero, después binario
+    return (cat is not None, cat or '')
+
+
+def _firma(productos):
+    # Una sección cambia si cambia alguno de sus productos (sube su
+    # versión) o si se agrega/quita uno (cambia la cantidad).
+    return len(productos), max(p['version'] for p in productos)
+
+
+class VistaInventario:
+    """Catálogo agrupado por categoría para una versión dada."""
+
+    def __init__(self, version, secciones, stock_bajo, firmas=None, categoria_de=None):
+        self.version = version
+        self.secciones = secciones
+        self.stock_bajo = stock_bajo
+        self.total = sum(len(ps) for ps in secciones.values())
+        if firmas is None:
+            firmas = {cat: _firma(ps) for cat, ps in secciones.items()}
+        if categoria_de is None:
+            categoria_de = {p['id']: cat for cat, ps in secciones.items() for p in ps}
+        self.firmas = firmas
+        self.categoria_de = categoria_de
+
+    @classmethod
+    def desde_productos(cls, version, productos, stock_bajo):
+        secciones = {}
+        for p in productos:
+            secciones.setdefault(p['categoria'], []).append(p)
+        return cls(version, secciones, stock_bajo)
+
+    def con_cambios(self, version, cambiados, borrados, stock_bajo):
+        """Nueva vista a partir de esta, tocando solo las secciones afectadas."""
+        quitar = set(borrados) | {p['id'] for p in cambiados}
+        afectadas = {self.categoria_de[i] for i in quitar if i in self.categoria_de}
+        afectadas |= {p['categoria'] for p in cambiados}
+        secciones = dict(self.secciones)
+        firmas = dict(self.firmas)
+        categoria_de = dict(self.categoria_de)
+        for i in borrados:
+            categoria_de.pop(i, None)
+        for p in cambiados:
+            categoria_de[p['id']] = p['categoria']
+        for cat in afectadas:
+            productos = [p for p in secciones.get(cat, []) if p['id'] not in quitar]
+            productos += [p for p in cambiados if p['categoria'] == cat]
+            productos.sort(key=lambda p: p['id'])
+            if productos:
+                secciones[cat] = productos
+                firmas[cat] = _firma(productos)
+            else:
+                secciones.pop(cat, None)
+                firmas.pop(cat, None)
+        if any(cat not in self.secciones for cat in secciones):
+            secciones = {cat: secciones[cat] for cat in sorted(secciones, key=_orden_categoria)}
+        return VistaInventario(version, secciones, stock_bajo, firmas, categoria_de)
+
+
+_lock = threading.Lock()
+_vista = None
+_fragmentos = {}
+
+
+def vista(conn):
+    """Devuelve la vista de la versión vigente.
+
+    Si el catálogo no cambió, es la misma de la vez anterior. Si cambiaron
+    pocos productos, se parchea la anterior con solo esos cambios; si no,
+    se arma de nuevo.
+    """
+    global _vista
+    conn.execute('BEGIN')  # versión y datos de la misma foto de la base
+    try:
+        version = catalogo.version_actual(conn)
+        actual = _vista
+        if actual is not None and actual.version == version:
+            return actual
+        stock_bajo = [dict(p) for p in conn.execute(
+            'SELECT id, nombre, stock, stock_minimo FROM productos WHERE stock <= stock_minimo ORDER BY stock')]
+        nueva = None
+        if actual is not None and actual.version < version:
+            cambiados = conn.execute('SELECT * FROM productos WHERE version > ? LIMIT ?',
+                                     (actual.version, MAX_CAMBIOS_INCREMENTALES + 1)).fetchall()
+            if len(cambiados) <= MAX_CAMBIOS_INCREMENTALES:
+                borrados = [b['id'] for b in conn.execute(
+                    'SELECT id FROM productos_borrados WHERE version > ?', (actual.version,))]
+                nueva = actual.con_cambios(version, [dict(p) for p in cambiados], borrados, stock_bajo)
+        if nueva is None:
+            productos = [dict(p) for p in conn.execute('SELECT * FROM productos ORDER BY categoria')]
+            nueva = VistaInventario.desde_productos(version, productos, stock_bajo)
+    finally:
+        conn.commit()
+
+    with _lock:
+        if _vista is None or _vista.version <= version:
+            _vista = nueva
+            # Fuera los fragmentos de secciones que cambiaron o ya no existen
+            vigentes = {(cat, firma) for cat, firma in nueva.firmas.items()}
+            for clave in [c for c in _fragmentos if c[:2] not in vigentes]:
+                del _fragmentos[clave]
+    return nueva
+
+
+def _fragmento(vista_actual, categoria, pagina, macro, *args):
+    clave = (categoria, vista_actual.firmas[categoria], pagina)
+    html = _fragmentos.get(clave)
+    if html is None:
+        html = Markup(get_template_attribute(PLANTILLA_MACROS, macro)(*args))
+        with _lock:
+            _fragmentos[clave] = html
+    return html
+
+
+def secciones_para_pagina(vista_actual):
+    """Secciones listas para index.html.
+
+    Cada una es un dict con ``categoria``, ``total`` y ``html``. ``html`` es
+    None cuando la sección se carga diferida (catálogos grandes).
+    """
+    diferida = vista_actual.total > LIMITE_CARGA_COMPLETA
+    secciones = []
+    for cat, productos in vista_actual.secciones.items():
+        html = None
+        if not diferida:
+            html = _fragmento(vista_actual, cat, None, 'seccion', cat, productos)
+        secciones.append({'categoria': cat, 'total': len(productos), 'html': html})
+    return secciones
+
+
+def pagina_de_seccion(vista_actual, categoria, pagina):
+    """Filas HTML de una página de una sección y el número de la siguiente (o None)."""
+    productos = vista_actual.secciones.get(categoria)
+    if productos is None:
+        return None, None
+    desde = pagina * PRODUCTOS_POR_PAGINA
+    parte = productos[desde:desde + PRODUCTOS_POR_PAGINA]
+    siguiente = pagina + 1 if desde + PRODUCTOS_POR_PAGINA < len(productos) else None
+    return _fragmento(vista_actual, categoria, pagina, 'filas', parte), siguiente
+
+
+def invalidar():
+    """Descarta vista y fragmentos (las escrituras igual cambian la versión)."""
+    global _vista
+    with _lock:
+        _vista = None
+        _fragmentos.clear()
@@ -1,13 +1,26 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify
-from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
+from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify, stream_with_context
+from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user, login_url
 from flask_cors import CORS
-import sqlite3
-from datetime import datetime
+from datetime import datetime, timedelta
 import os 
+import alertas
+import buscador
+import catalogo
+import click
+import db
+import importacion
+import inventario
+import metricas
+import migraciones
+import reportes
+import sincronizacion
+import ventas
 
-app = Flask(__name__, template_folder='.')
+app = Flask(__name__, template_folder='templates')
 app.secret_key = 'ColorHada_Secret_Key'
 CORS(app)
+db.init_app(app)
+metricas.init_app(app)
 
 # --- CONFIGURACIÓN DE LOGIN ---
 login_manager = LoginManager()
@@ -22,16 +35,35 @@ class User(UserMixin):
 def load_user(user_id):
     return User(user_id)
 
+@login_manager.unauthorized_handler
+def no_autorizado():
+    # La API contesta 401 en JSON: un redirect a la página de login no le
+    # sirve a un cliente que espera JSON (la app lo confundiría con éxito)
+    if request.path.startswith('/api/'):
+        return jsonify({'error': 'Se requiere iniciar sesión'}), 401
+    # Mismo comportamiento que el de Flask-Login por defecto
+    gestor = app.login_manager
+    flash(gestor.login_message, gestor.login_message_category)
+    return redirect(login_url(gestor.login_view, next_url=request.url))
+
 def conectar():
-    base_dir = os.path.abspath(os.path.dirname(__file__))
-    db_path = os.path.join(base_dir, 'libreria.db')
-    conn = sqlite3.connect(db_path)
-    conn.row_factory = sqlite3.Row
-    return conn
+    # Conexión persistente del hilo (WAL + PRAGMAs), ver db.py.
+    # conn.close() la devuelve para el próximo pedido en vez de cerrarla.
+    return db.obtener_conexion()
 
 # -- INICIALIZACION DE BASE DE DATOS --
 def inicializar_db():
     conn = conectar()
+    conn.execute('''
+                 CREATE TABLE IF NOT EXISTS productos (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    nombre TEXT NOT NULL,
+                    stock INTEGER NOT NULL,
+                    stock_minimo INTEGER DEFAULT 5,
+                    precio REAL NOT NULL,
+                    categoria TEXT DEFAULT 'General'
+                )
+            ''')
     conn.execute('''
                  CREATE TABLE IF NOT EXISTS servicios (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -63,7 +95,10 @@ def inicializar_db():
     except:
         pass
     conn.commit()
-    conn.close()
+    migraciones.migrar(conn)
+    # Cierre real: con gunicorn --preload los workers no deben heredar por
+    # fork() una conexión SQLite abierta en el proceso maestro
+    db.cerrar_conexion()
 
 inicializar_db()
 
@@ -83,6 +118,22 @@ def login():
         flash('Usuario o contraseña incorrectos')
     return render_template('login.html')
 
+@app.route('/api/login', methods=['POST'])
+def api_login():
+    # Login de la app móvil: {"usuario": "...", "password": "..."}. Deja la
+    # cookie de sesión (y la de "recordarme", para no pedirlo en cada arranque).
+    datos = request.get_json(silent=True)
+    if not isinstance(datos, dict):
+        return jsonify({'error': 'Se esperaba un objeto JSON {"usuario": ..., "password": ...}'}), 400
+    conn = conectar()
+    user_db = conn.execute("SELECT * FROM usuarios WHERE username = ? AND password = ?",
+                           (datos.get('usuario'), datos.get('password'))).fetchone()
+    conn.close()
+    if not user_db:
+        return jsonify({'error': 'Usuario o contraseña incorrectos'}), 401
+    login_user(User(user_db['id']), remember=True)
+    return jsonify({'ok': True})
+
 @app.route('/registro', methods=['GET', 'POST'])
 def registro():
     if request.method == 'POST':
@@ -102,31 +153,60 @@ def registro():
 @app.route('/logout')
 def logout():
     session.pop('alertas_mostradas', None)
+    session.pop('ultima_alerta', None)
     logout_user()
     return redirect(url_for('login'))
 
 # --- RUTAS DEL SISTEMA ---
 
+# Cuántas alertas de stock bajo se muestran al entrar (el resto se resume)
+MAX_ALERTAS_INICIO = 10
+
 @app.route('/')
 @login_required
 def index():
     conn = conectar()
-    productos = conn.execute('SELECT * FROM productos ORDER BY categoria').fetchall()
-    secciones = {}
+    vista = inventario.vista(conn)
     
     if 'alertas_mostradas' not in session:
-        for p in productos:
-            if p['stock'] <= p['stock_minimo']:
-                flash(f"⚠️ ¡Stock Bajo! Quedan solo {p['stock']} de: {p['nombre']}", "warning")
+        for p in vista.stock_bajo[:MAX_ALERTAS_INICIO]:
+            flash(f"⚠️ ¡Stock Bajo! Quedan solo {p['stock']} de: {p['nombre']}", "warning")
+        if len(vista.stock_bajo) > MAX_ALERTAS_INICIO:
+            flash(f"⚠️ Y {len(vista.stock_bajo) - MAX_ALERTAS_INICIO} productos más con stock bajo", "warning")
         session['alertas_mostradas'] = True
+        session['ultima_alerta'] = alertas.ultima_id(conn)
+    else:
+        # Después de la primera visita solo se avisan los productos que
+        # bajaron del mínimo desde la última vez
+        nuevas = alertas.alertas_desde(conn, session.get('ultima_alerta', 0), MAX_ALERTAS_INICIO)
+        for a in nuevas:
+            flash(f"⚠️ ¡Stock Bajo! Quedan solo {a['stock']} de: {a['nombre']}", "warning")
+        if nuevas:
+            session['ultima_alerta'] = nuevas[-1]['id']
+    conn.close()
     
-    for p in productos:
-        cat = p['categoria']
-        if cat not in secciones: secciones[cat] = []
-        secciones[cat].append(p)
-        
+    return render_template('index.html', secciones=inventario.secciones_para_pagina(vista),
+                           ultima_alerta=session.get('ultima_alerta', 0))
+
+@app.route('/inventario/seccion')
+@login_required
+def inventario_seccion():
+    # Una página de filas de una categoría, para las secciones diferidas de index.html
+    categoria = request.args.get('categoria', '')
+    try:
+        pagina = max(int(request.args.get('pagina', 0)), 0)
+    except ValueError:
+        pagina = 0
+    conn = conectar()
+    vista = inventario.vista(conn)
     conn.close()
-    return render_template('index.html', secciones=secciones)
+    html, siguiente = inventario.pagina_de_seccion(vista, categoria, pagina)
+    if html is None:
+        return 'Sección inexistente', 404
+    resp = app.response_class(html, mimetype='text/html')
+    if siguiente is not None:
+        resp.headers['X-Siguiente-Pagina'] = str(siguiente)
+    return resp
 
 @app.route('/agregar', methods=['POST'])
 @login_required
@@ -154,18 +234,14 @@ def vender():
     id_prod = int(request.form['id'])
     cant = int(request.form['cantidad'])
     conn = conectar()
-    p = conn.execute('SELECT * FROM productos WHERE id = ?', (id_prod,)).fetchone()
-    if p:
-        if p['stock'] >= cant:
-            total_venta = p['precio'] * cant
-            conn.execute('UPDATE productos SET stock = stock - ? WHERE id = ?', (cant, id_prod))
-            conn.execute('INSERT INTO ventas (producto_nombre, cantidad, monto_total) VALUES (?, ?, ?)',
-                         (p['nombre'], cant, total_venta))
-            conn.commit()
-            flash(f"✅ Venta exitosa: {p['nombre']} (x{cant})", "success")
-        else:
-            flash(f"❌ Error: No hay stock suficiente de {p['nombre']}.", "danger")
+    resultado = ventas.vender_producto(conn, id_prod, cant)
     conn.close()
+    if resultado['ok']:
+        flash(f"✅ Venta exitosa: {resultado['nombre']} (x{cant})", "success")
+    elif resultado['error'] == 'sin_stock':
+        flash(f"❌ Error: No hay stock suficiente de {resultado['nombre']}.", "danger")
+    elif resultado['error'] == 'cantidad_invalida':
+        flash("❌ Error: La cantidad debe ser mayor a cero.", "danger")
     return redirect(url_for('index'))
 
 @app.route('/registrar_servicio', methods=['POST'])
@@ -210,20 +286,28 @@ def buscar_precio():
     if request.method == 'POST':
         busqueda = request.form.get('busqueda', '')
         conn = conectar()
-        query = "SELECT * FROM productos WHERE nombre LIKE ? ORDER BY categoria"
-        resultados = conn.execute(query, ('%' + busqueda + '%',)).fetchall()
+        resultados = buscador.buscar_productos(conn, busqueda)
         conn.close()
     return render_template('buscar_precio.html', resultados=resultados, busqueda=busqueda)
 
+def rango_del_dia(dia):
+    # [dia, dia siguiente) como texto: compara bien contra 'YYYY-MM-DD HH:MM:SS'
+    # y, a diferencia de date(fecha) = ?, usa los índices idx_*_fecha
+    siguiente = (datetime.strptime(dia, '%Y-%m-%d') + timedelta(days=1)).strftime('%Y-%m-%d')
+    return dia, siguiente
+
 @app.route('/historial')
 @login_required
 def historial():
     conn = conectar()
     hoy = datetime.now().strftime('%Y-%m-%d')
-    ventas = conn.execute('SELECT * FROM ventas WHERE date(fecha) = ?', (hoy,)).fetchall()
-    servicios = conn.execute('SELECT * FROM servicios WHERE date(fecha) = ?', (hoy,)).fetchall()
-    total_v = sum(v['monto_total'] for v in ventas)
-    total_s = sum(s['monto'] for s in servicios)
+    rango = rango_del_dia(hoy)
+    ventas = conn.execute('SELECT * FROM ventas WHERE fecha >= ? AND fecha < ?', rango).fetchall()
+    servicios = conn.execute('SELECT * FROM servicios WHERE fecha >= ? AND fecha < ?', rango).fetchall()
+    total_v, total_s = conn.execute('''
+        SELECT (SELECT COALESCE(SUM(monto_total), 0) FROM ventas WHERE fecha >= ?1 AND fecha < ?2),
+               (SELECT COALESCE(SUM(monto), 0) FROM servicios WHERE fecha >= ?1 AND fecha < ?2)
+    ''', rango).fetchone()
     conn.close()
     return render_template('historial.html', ventas=ventas, servicios=servicios, 
                            total_v=total_v, total_s=total_s, total_dia=total_v+total_s, fecha=hoy)
@@ -242,8 +326,164 @@ def borrar(id):
 
 @app.route('/api/productos', methods=['GET'])
 def api_productos():
+    # Sin parámetros: lista completa. ?since=<version> solo cambios y borrados,
+    # ?limit=&cursor= paginado. Ver catalogo.py.
+    try:
+        since, limite, cursor = catalogo.parsear_parametros(request.args)
+    except ValueError as e:
+        return jsonify({'error': f'Parámetros inválidos: {e}'}), 400
+    codificacion = catalogo.elegir_codificacion(request.accept_encodings)
+    clave = (since, limite, cursor, codificacion)
+
     conn = conectar()
-    productos = conn.execute('SELECT * FROM productos').fetchall()
+    conn.execute('BEGIN')  # misma foto de la base para la versión y los datos
+    version = catalogo.version_actual(conn)
+    etag = catalogo.etag(version, clave)
+    if request.if_none_match.contains(etag):
+        conn.close()
+        resp = app.response_class(status=304)
+    else:
+        guardado = catalogo.cache.obtener(version, clave)
+        if guardado is None:
+            datos = catalogo.armar_respuesta(conn, version, since, limite, cursor)
+            guardado = catalogo.codificar(app.json.dumps(datos).encode('utf-8'), codificacion)
+            catalogo.cache.guardar(version, clave, guardado)
+        conn.close()
+        cuerpo, usada = guardado
+        resp = app.response_class(cuerpo, mimetype='application/json')
+        if usada:
+            resp.headers['Content-Encoding'] = usada
+    resp.set_etag(etag)
+    resp.headers['X-Catalogo-Version'] = str(version)
+    resp.headers['Cache-Control'] = 'no-cache'
+    resp.vary.add('Accept-Encoding')
+    return resp
+
+@app.route('/api/ventas/lote', methods=['POST'])
+@login_required
+def api_ventas_lote():
+    # Recibe el carrito completo: {"items": [{"id": 3, "cantidad": 2}, ...]}
+    datos = request.get_json(silent=True)
+    if not isinstance(datos, dict):
+        return jsonify({'error': 'Se esperaba un objeto JSON {"items": [...]}'}), 400
+    items = datos.get('items')
+    if not isinstance(items, list) or not items:
+        return jsonify({'error': 'Se esperaba una lista "items" con al menos una línea'}), 400
+    if len(items) > ventas.MAX_LINEAS_LOTE:
+        return jsonify({'error': f'Máximo {ventas.MAX_LINEAS_LOTE} líneas por venta'}), 400
+    conn = conectar()
+    resultados = ventas.vender_lote(conn, items)
+    conn.close()
+    vendidas = [r for r in resultados if r['ok']]
+    return jsonify({
+        'resultados': resultados,
+        'lineas_vendidas': len(vendidas),
+        'total': sum(r['total'] for r in vendidas),
+    })
+
+@app.route('/api/sync', methods=['POST'])
+@login_required
+def api_sync():
+    # Cola offline de la app: {"operaciones": [{"clave": "...", "tipo": "venta", "id": 3, "cantidad": 2},
+    #                                          {"clave": "...", "tipo": "alta", "nombre": "...", ...},
+    #                                          {"clave": "...", "tipo": "stock", "id": 3, "stock": 10}]}
+    # Escribe en el catálogo: pide sesión como las demás rutas de escritura.
+    # La app la obtiene con /api/login; sin sesión la respuesta es 401 JSON.
+    datos = request.get_json(silent=True)
+    if not isinstance(datos, dict):
+        return jsonify({'error': 'Se esperaba un objeto JSON {"operaciones": [...]}'}), 400
+    operaciones = datos.get('operaciones')
+    if not isinstance(operaciones, list) or not operaciones:
+        return jsonify({'error': 'Se esperaba una lista "operaciones" con al menos una operación'}), 400
+    if len(operaciones) > sincronizacion.MAX_OPERACIONES:
+        return jsonify({'error': f'Máximo {sincronizacion.MAX_OPERACIONES} operaciones por sincronización'}), 400
+    conn = conectar()
+    resultados, stock = sincronizacion.sincronizar(conn, operaciones)
+    version = catalogo.version_actual(conn)
+    conn.close()
+    return jsonify({'resultados': resultados, 'stock': stock, 'version': version})
+
+@app.route('/api/productos/importar', methods=['POST'])
+@login_required
+def api_importar_productos():
+    # Acepta el archivo como cuerpo del pedido (CSV, NDJSON o lista JSON) o
+    # como campo "archivo" de un formulario. ?formato= fuerza el formato.
+    if request.mimetype == 'multipart/form-data':
+        archivo = request.files.get('archivo')
+        if archivo is None:
+            return jsonify({'error': 'Falta el campo "archivo"'}), 400
+        flujo = archivo.stream
+        formato = request.args.get('formato') or importacion.formato_desde(archivo.filename, archivo.mimetype)
+    else:
+        flujo = request.stream
+        formato = request.args.get('formato') or importacion.formato_desde(content_type=request.mimetype)
+    if formato not in importacion.FORMATOS:
+        return jsonify({'error': f"formato debe ser uno de: {', '.join(importacion.FORMATOS)}"}), 400
+
+    conn = conectar()
+    resultado = importacion.importar(conn, importacion.leer_filas(flujo, formato))
+    conn.close()
+    # Con error_fatal igual se informa lo que llegó a grabarse
+    return jsonify(resultado.como_dict()), 400 if resultado.error_fatal else 200
+
+@app.route('/api/productos/exportar', methods=['GET'])
+def api_exportar_productos():
+    formato = request.args.get('formato', 'csv')
+    if formato not in ('csv', 'ndjson'):
+        return jsonify({'error': 'formato debe ser "csv" o "ndjson"'}), 400
+    conn = conectar()
+    tipo = 'text/csv' if formato == 'csv' else 'application/x-ndjson'
+    resp = app.response_class(stream_with_context(importacion.exportar(conn, formato)), mimetype=tipo)
+    resp.headers['Content-Disposition'] = f'attachment; filename=catalogo.{formato}'
+    return resp
+
+@app.route('/api/alertas', methods=['GET'])
+def api_alertas():
+    # ?since=<id de la última alerta vista>; sin since, las más recientes
+    try:
+        since = request.args.get('since')
+        since = int(since) if since not in (None, '') else None
+        limite = min(max(int(request.args.get('limite', alertas.LIMITE_POR_DEFECTO)), 1), alertas.LIMITE_MAXIMO)
+    except ValueError:
+        return jsonify({'error': 'since y limite deben ser números'}), 400
+    conn = conectar()
+    lista = alertas.alertas_desde(conn, since, limite)
+    ultima = alertas.ultima_id(conn)
+    conn.close()
+    return jsonify({'alertas': lista, 'ultima': ultima})
+
+@app.route('/api/alertas/stream', methods=['GET'])
+@login_required
+def api_alertas_stream():
+    # Server-Sent Events. Al reconectar, el navegador manda Last-Event-ID y
+    # seguimos desde ahí; si no, desde ?since= o desde ahora. Cada stream
+    # abierto ocupa un hilo hasta DURACION_STREAM: con el worker sync de
+    # gunicorn deja al worker sin atender otra cosa. Solo para clientes que
+    # corran contra workers gthread/gevent; la página principal no lo usa
+    # (consulta /api/alertas).
+    desde = request.headers.get('Last-Event-ID') or request.args.get('since')
+    conn = conectar()
+    try:
+        since = int(desde) if desde else alertas.ultima_id(conn)
+    except ValueError:
+        return jsonify({'error': 'since debe ser un número'}), 400
+    resp = app.response_class(stream_with_context(alertas.stream(conn, since)), mimetype='text/event-stream')
+    resp.headers['Cache-Control'] = 'no-cache'
+    resp.headers['X-Accel-Buffering'] = 'no'
+    return resp
+
+@app.route('/api/buscar', methods=['GET'])
+def api_buscar():
+    # Búsqueda para escribir y ver resultados: /api/buscar?q=lapiz&limite=20
+    try:
+        limite = min(max(int(request.args.get('limite', buscador.LIMITE_API)), 1), buscador.LIMITE_MAXIMO)
+    except ValueError:
+        return jsonify({'error': 'limite debe ser un número'}), 400
+    q = request.args.get('q', '')
+    if not buscador.consulta_fts(q):
+        return jsonify([])
+    conn = conectar()
+    productos = buscador.buscar_productos(conn, q, limite)
     conn.close()
     return jsonify([dict(p) for p in productos])
 
@@ -251,10 +491,108 @@ def api_productos():
 def api_historial():
     conn = conectar()
     hoy = datetime.now().strftime('%Y-%m-%d')
-    ventas = conn.execute('SELECT * FROM ventas WHERE date(fecha) = ?', (hoy,)).fetchall()
+    ventas = conn.execute('SELECT * FROM ventas WHERE fecha >= ? AND fecha < ?', rango_del_dia(hoy)).fetchall()
     conn.close()
     return jsonify([dict(v) for v in ventas])
 
+# --- MÉTRICAS (Prometheus) ---
+
+@app.route('/metrics')
+def metrics():
+    return app.response_class(metricas.exportar(), mimetype='text/plain; version=0.0.4')
+
+# --- REPORTES (leen de los resúmenes diarios, ver reportes.py) ---
+# ?desde=YYYY-MM-DD&hasta=YYYY-MM-DD (inclusive, por defecto los últimos 30 días)
+
+def _rango_reporte():
+    return reportes.parsear_rango(request.args.get('desde'), request.args.get('hasta'))
+
+@app.route('/api/reportes/totales', methods=['GET'])
+def api_reportes_totales():
+    try:
+        desde, hasta = _rango_reporte()
+    except ValueError as e:
+        return jsonify({'error': f'Rango de fechas inválido: {e}'}), 400
+    agrupar = request.args.get('agrupar', 'dia')
+    if agrupar not in ('dia', 'mes'):
+        return jsonify({'error': 'agrupar debe ser "dia" o "mes"'}), 400
+    conn = conectar()
+    periodos = reportes.totales(conn, desde, hasta, agrupar)
+    conn.close()
+    return jsonify({
+        'desde': desde, 'hasta': hasta, 'agrupar': agrupar,
+        'periodos': periodos,
+        'total': sum(p['total'] for p in periodos),
+    })
+
+@app.route('/api/reportes/top_productos', methods=['GET'])
+def api_reportes_top_productos():
+    try:
+        desde, hasta = _rango_reporte()
+        limite = min(max(int(request.args.get('limite', 10)), 1), 100)
+    except ValueError as e:
+        return jsonify({'error': f'Parámetros inválidos: {e}'}), 400
+    orden = request.args.get('orden', 'monto')
+    if orden not in reportes.ORDENES_TOP:
+        return jsonify({'error': 'orden debe ser "monto" o "cantidad"'}), 400
+    conn = conectar()
+    productos = reportes.top_productos(conn, desde, hasta, limite, orden)
+    conn.close()
+    return jsonify({'desde': desde, 'hasta': hasta, 'orden': orden, 'productos': productos})
+
+@app.route('/api/reportes/servicios', methods=['GET'])
+def api_reportes_servicios():
+    try:
+        desde, hasta = _rango_reporte()
+    except ValueError as e:
+        return jsonify({'error': f'Rango de fechas inválido: {e}'}), 400
+    conn = conectar()
+    servicios = reportes.mix_servicios(conn, desde, hasta)
+    conn.close()
+    return jsonify({'desde': desde, 'hasta': hasta, 'servicios': servicios})
+
+# --- COMANDOS DE MANTENIMIENTO (flask --app main <comando>) ---
+
+@app.cli.command('reconstruir-resumenes')
+def reconstruir_resumenes():
+    """Recalcula los resúmenes diarios desde ventas y servicios."""
+    conn = conectar()
+    filas_v, filas_s = reportes.reconstruir(conn)
+    conn.close()
+    click.echo(f'Resúmenes reconstruidos: {filas_v} filas de ventas, {filas_s} de servicios')
+
+@app.cli.command('verificar-resumenes')
+def verificar_resumenes():
+    """Compara los resúmenes diarios contra las tablas crudas."""
+    conn = conectar()
+    diferencias = reportes.verificar(conn)
+    conn.close()
+    if not diferencias:
+        click.echo('Resúmenes consistentes')
+        return
+    for d in diferencias:
+        click.echo(f"{d['tabla']} [{d['origen']}] {d['dia']} {d['clave']}: cantidad={d['cantidad']} monto={d['monto']}")
+    raise SystemExit(1)
+
+@app.cli.command('importar-catalogo')
+@click.argument('archivo', type=click.Path(exists=True, dir_okay=False))
+@click.option('--formato', type=click.Choice(importacion.FORMATOS), help='Por defecto, según la extensión')
+def importar_catalogo(archivo, formato):
+    """Importa productos desde un CSV, NDJSON o lista JSON."""
+    formato = formato or importacion.formato_desde(archivo)
+    conn = conectar()
+    with open(archivo, 'rb') as flujo:
+        resultado = importacion.importar(
+            conn, importacion.leer_filas(flujo, formato),
+            al_avanzar=lambda r: click.echo(f'  {r.procesadas} filas leídas, {r.importadas} importadas', err=True))
+    conn.close()
+    for e in resultado.errores:
+        click.echo(f"Fila {e['fila']}: {e['error']}")
+    click.echo(f'Importadas {resultado.importadas} de {resultado.procesadas} filas ({resultado.con_error} con error)')
+    if resultado.error_fatal:
+        click.echo(f'Importación interrumpida: {resultado.error_fatal}', err=True)
+        raise SystemExit(1)
+
 # --- CONFIGURACIÓN PARA NUBE ---
 if __name__ == '__main__':
     # Usamos el puerto que nos dé el servidor o el 5000 por defecto
@@ -0,0 +1,237 @@
+# -- MÉTRICAS DE RENDIMIENTO --
+# Por cada pedido se mide la latencia total, cuántas consultas SQL hizo y
+# cuánto tardaron, y cuánto llevó renderizar las plantillas. Todo queda en
+# memoria del proceso y se publica en /metrics con el formato de texto de
+# Prometheus. Con gunicorn cada worker tiene sus propios contadores: el
+# scrapeo ve el worker que atiende ese pedido.
+#
+# El costo por pedido es un par de perf_counter() y unas sumas bajo un lock,
+# así que puede quedar prendido en producción.
+
+import bisect
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from flask import current_app, g, has_request_context, request
+from flask.signals import before_render_template, template_rendered
+
+import db
+
+# Límites de los histogramas de latencia, en segundos
+CUBETAS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Límites del histograma de cantidad de consultas por pedido
+CUBETAS_CONSULTAS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+# Consultas más lentas que esto se loguean con el texto de la sentencia
+UMBRAL_CONSULTA_LENTA = float(os.environ.get('UMBRAL_CONSULTA_LENTA', '0.1'))
+
+MAX_TEXTO_SQL = 500
+
+log_sql = logging.getLogger('libreria.sql')
+
+
+class Histograma:
+    def __init__(self, cubetas=CUBETAS):
+        self.cubetas = cubetas
+        self.conteos = [0] * (len(cubetas) + 1)
+        self.suma = 0.0
+        self.cantidad = 0
+
+    def observar(self, valor):
+        self.conteos[bisect.bisect_left(self.cubetas, valor)] += 1
+        self.suma += valor
+        self.cantidad += 1
+
+
+class Registro:
+    """Contadores e histogramas del proceso."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencias = {}       # (endpoint, método) -> Histograma
+        self.pedidos = {}         # (endpoint, método, status) -> cantidad
+        self.sql = {}             # endpoint -> [consultas, segundos]
+        self.sql_por_pedido = {}  # endpoint -> Histograma (cantidad de consultas)
+        self.render = {}          # plantilla -> Histograma
+        self.consultas_lentas = 0
+        self.bloqueos = 0
+
+    def pedido(self, endpoint, metodo, status, segundos, consultas, segundos_sql):
+        with self._lock:
+            clave = (endpoint, metodo)
+            if clave not in self.latencias:
+                self.latencias[clave] = Histograma()
+            if endpoint not in self.sql_por_pedido:
+                self.sql_por_pedido[endpoint] = Histograma(CUBETAS_CONSULTAS)
+            self.latencias[clave].observar(segundos)
+            self.sql_por_pedido[endpoint].observar(consultas)
+            clave_status = (endpoint, metodo, status)
+            self.pedidos[clave_status] = self.pedidos.get(clave_status, 0) + 1
+            acumulado = self.sql.setdefault(endpoint, [0, 0.0])
+            acumulado[0] += consultas
+            acumulado[1] += segundos_sql
+
+    def plantilla(self, nombre, segundos):
+        with self._lock:
+            self.render.setdefault(nombre, Histograma()).observar(segundos)
+
+    def sumar_lenta(self):
+        with self._lock:
+            self.consultas_lentas += 1
+
+    def sumar_bloqueo(self):
+        with self._lock:
+            self.bloqueos += 1
+
+    def reiniciar(self):
+        with self._lock:
+            self.latencias, self.pedidos, self.sql, self.sql_por_pedido, self.render = {}, {}, {}, {}, {}
+            self.consultas_lentas = self.bloqueos = 0
+
+
+registro = Registro()
+
+
+# --- GANCHOS ---
+
+def _estado():
+    """Acumuladores del pedido en curso (None fuera de un pedido)."""
+    if not has_request_context():
+        return None
+    estado = g.get('_metricas')
+    if estado is None:
+        estado = g._metricas = {'inicio': time.perf_counter(), 'sql': 0, 'sql_segundos': 0.0,
+                                'render_segundos': 0.0, 'render_inicio': []}
+    return estado
+
+
+def observar_sql(sql, segundos, error):
+    """Lo llama db.ConexionPersistente después de cada execute/executemany."""
+    if error is not None and isinstance(error, sqlite3.OperationalError) and 'locked' in str(error):
+        registro.sumar_bloqueo()
+    if segundos >= UMBRAL_CONSULTA_LENTA:
+        registro.sumar_lenta()
+        endpoint = request.endpoint if has_request_context() else None
+        log_sql.warning('Consulta lenta (%.1f ms) en %s: %s', segundos * 1000, endpoint or '-',
+                        ' '.join(sql.split())[:MAX_TEXTO_SQL])
+    estado = _estado()
+    if estado is not None:
+        estado['sql'] += 1
+        estado['sql_segundos'] += segundos
+
+
+def _antes_de_renderizar(app, template, context, **extra):
+    estado = _estado()
+    if estado is not None:
+        estado['render_inicio'].append(time.perf_counter())
+
+
+def _despues_de_renderizar(app, template, context, **extra):
+    estado = _estado()
+    if estado is not None and estado['render_inicio']:
+        segundos = time.perf_counter() - estado['render_inicio'].pop()
+        estado['render_segundos'] += segundos
+        registro.plantilla(template.name or '-', segundos)
+
+
+def _antes_del_pedido():
+    _estado()
+
+
+def _despues_del_pedido(resp):
+    estado = g.pop('_metricas', None)
+    if estado is None:
+        return resp
+    segundos = time.perf_counter() - estado['inicio']
+    endpoint = request.endpoint or 'sin_ruta'
+    registro.pedido(endpoint, request.method, resp.status_code, segundos,
+                    estado['sql'], estado['sql_segundos'])
+    if resp.headers.get('Server-Timing') is None and _server_timing_activo():
+        resp.headers['Server-Timing'] = (
+            f"sql;desc=\"{estado['sql']} consultas\";dur={estado['sql_segundos'] * 1000:.2f}, "
+            f"render;dur={estado['render_segundos'] * 1000:.2f}, "
+            f"total;dur={segundos * 1000:.2f}")
+    return resp
+
+
+def _server_timing_activo():
+    return current_app.config.get('SERVER_TIMING', False)
+
+
+def init_app(app):
+    app.config.setdefault('SERVER_TIMING', os.environ.get('SERVER_TIMING') == '1')
+    app.before_request(_antes_del_pedido)
+    app.after_request(_despues_del_pedido)
+    before_render_template.connect(_antes_de_renderizar, app)
+    template_rendered.connect(_despues_de_renderizar, app)
+    db.observador = observar_sql
+
+
+# --- EXPOSICIÓN ---
+
+def _etiquetas(**valores):
+    partes = []
+    for nombre, valor in valores.items():
+        valor = str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        partes.append(f'{nombre}="{valor}"')
+    return '{' + ','.join(partes) + '}'
+
+
+def _histograma(lineas, nombre, etiquetas, h):
+    acumulado = 0
+    for limite, conteo in zip(h.cubetas, h.conteos):
+        acumulado += conteo
+        lineas.append(f'{nombre}_bucket{_etiquetas(**etiquetas, le=limite)} {acumulado}')
+    lineas.append(f'{nombre}_bucket{_etiquetas(**etiquetas, le="+Inf")} {h.cantidad}')
+    lineas.append(f'{nombre}_sum{_etiquetas(**etiquetas)} {h.suma:.6f}')
+    lineas.append(f'{nombre}_count{_etiquetas(**etiquetas)} {h.cantidad}')
+
+
+def exportar():
+    """Texto para /metrics (formato de exposición 0.0.4 de Prometheus)."""
+    # El pid deja distinguir a qué worker de gunicorn le tocó el scrapeo
+    lineas = ['# HELP libreria_proceso_info Proceso que atendió este scrapeo',
+              '# TYPE libreria_proceso_info gauge',
+              f'libreria_proceso_info{_etiquetas(pid=os.getpid())} 1']
+    with registro._lock:
+        lineas += ['# HELP libreria_pedido_duracion_segundos Latencia de los pedidos por endpoint',
+                   '# TYPE libreria_pedido_duracion_segundos histogram']
+        for (endpoint, metodo), h in sorted(registro.latencias.items()):
+            _histograma(lineas, 'libreria_pedido_duracion_segundos', {'endpoint': endpoint, 'metodo': metodo}, h)
+
+        lineas += ['# HELP libreria_pedidos_total Pedidos atendidos por endpoint y status',
+                   '# TYPE libreria_pedidos_total counter']
+        for (endpoint, metodo, status), n in sorted(registro.pedidos.items()):
+            lineas.append(f'libreria_pedidos_total{_etiquetas(endpoint=endpoint, metodo=metodo, status=status)} {n}')
+
+        lineas += ['# HELP libreria_sql_por_pedido Consultas SQL hechas en cada pedido',
+                   '# TYPE libreria_sql_por_pedido histogram']
+        for endpoint, h in sorted(registro.sql_por_pedido.items()):
+            _histograma(lineas, 'libreria_sql_por_pedido', {'endpoint': endpoint}, h)
+
+        lineas += ['# HELP libreria_sql_consultas_total Consultas SQL por endpoint',
+                   '# TYPE libreria_sql_consultas_total counter']
+        for endpoint, (n, _) in sorted(registro.sql.items()):
+            lineas.append(f'libreria_sql_consultas_total{_etiquetas(endpoint=endpoint)} {n}')
+
+        lineas += ['# HELP libreria_sql_segundos_total Tiempo total en consultas SQL por endpoint',
+                   '# TYPE libreria_sql_segundos_total counter']
+        for endpoint, (_, segundos) in sorted(registro.sql.items()):
+            lineas.append(f'libreria_sql_segundos_total{_etiquetas(endpoint=endpoint)} {segundos:.6f}')
+
+        lineas += ['# HELP libreria_render_duracion_segundos Tiempo de render de plantillas Jinja',
+                   '# TYPE libreria_render_duracion_segundos histogram']
+        for plantilla, h in sorted(registro.render.items()):
+            _histograma(lineas, 'libreria_render_duracion_segundos', {'plantilla': plantilla}, h)
+
+        lineas += ['# HELP libreria_sql_lentas_total Consultas por encima del umbral de consulta lenta',
+                   '# TYPE libreria_sql_lentas_total counter',
+                   f'libreria_sql_lentas_total {registro.consultas_lentas}',
+                   '# HELP libreria_sqlite_bloqueos_total Errores "database is locked"',
+                   '# TYPE libreria_sqlite_bloqueos_total counter',
+                   f'libreria_sqlite_bloqueos_total {registro.bloqueos}']
+    return '\n'.join(lineas) + '\n'
@@ -0,0 +1,101 @@
+# -- MIGRACIONES DEL ESQUEMA --
+# Cada paso se aplica una sola vez. El número de la última migración aplicada
+# queda guardado en PRAGMA user_version dentro del mismo archivo de la base.
+# Para agregar un cambio de esquema se suma una función al final de
+# MIGRACIONES; nunca se reordenan ni se editan las ya publicadas.
+
+import sqlite3
+
+import alertas
+import buscador
+import catalogo
+import inventario
+import reportes
+import sincronizacion
+
+
+def ejecutar_script(conn, script):
+    # executescript() hace COMMIT por su cuenta y rompería la transacción de
+    # la migración: separamos las sentencias (triggers incluidos) a mano.
+    sentencia = ''
+    for linea in script.splitlines(keepends=True):
+        sentencia += linea
+        if sqlite3.complete_statement(sentencia):
+            conn.execute(sentencia)
+            sentencia = ''
+    if sentencia.strip():
+        conn.execute(sentencia)
+
+
+def _indices_por_fecha(conn):
+    # Las consultas del historial filtran por rango (fecha >= dia AND
+    # fecha < dia siguiente), que sí puede usar estos índices; date(fecha)
+    # no podía. Para que el rango sea equivalente, las fechas tienen que
+    # estar en el formato canónico 'YYYY-MM-DD HH:MM:SS' que deja
+    # CURRENT_TIMESTAMP: normalizamos las filas viejas que no lo estén.
+    for tabla in ('ventas', 'servicios'):
+        conn.execute(f'UPDATE {tabla} SET fecha = datetime(fecha) '
+                     f'WHERE datetime(fecha) IS NOT NULL AND fecha IS NOT datetime(fecha)')
+        conn.execute(f'CREATE INDEX IF NOT EXISTS idx_{tabla}_fecha ON {tabla}(fecha)')
+
+
+def _resumenes_diarios(conn):
+    ejecutar_script(conn, reportes.TABLAS_RESUMEN)
+    reportes.recalcular_resumenes(conn)
+
+
+def _busqueda_productos(conn):
+    ejecutar_script(conn, buscador.TABLA_FTS)
+    conn.execute("INSERT INTO productos_fts (productos_fts) VALUES ('rebuild')")
+
+
+def _catalogo_versionado(conn):
+    columnas = {c['name'] for c in conn.execute('PRAGMA table_info(productos)')}
+    if 'version' not in columnas:
+        conn.execute('ALTER TABLE productos ADD COLUMN version INTEGER NOT NULL DEFAULT 0')
+    ejecutar_script(conn, catalogo.TABLAS_VERSION)
+    # Todo lo que ya existe queda en la versión 1: ?since=0 trae el catálogo entero
+    conn.execute('INSERT OR IGNORE INTO catalogo_version (id, version) VALUES (1, 1)')
+    conn.execute('UPDATE productos SET version = 1')
+
+
+def _indices_inventario(conn):
+    ejecutar_script(conn, inventario.INDICES)
+
+
+def _alertas_stock(conn):
+    ejecutar_script(conn, alertas.TABLA_ALERTAS)
+
+
+def _sync_operaciones(conn):
+    ejecutar_script(conn, sincronizacion.TABLA_SYNC)
+
+
+MIGRACIONES = [
+    _indices_por_fecha,
+    _resumenes_diarios,
+    _busqueda_productos,
+    _catalogo_versionado,
+    _indices_inventario,
+    _alertas_stock,
+    _sync_operaciones,
+]
+
+
+def migrar(conn):
+    """Aplica las migraciones pendientes. Seguro con varios workers arrancando a la vez."""
+    version = conn.execute('PRAGMA user_version').fetchone()[0]
+    while version < len(MIGRACIONES):
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # Releemos dentro del lock: otro worker pudo haber migrado recién
+            version = conn.execute('PRAGMA user_version').fetchone()[0]
+            if version < len(MIGRACIONES):
+                MIGRACIONES[version](conn)
+                version += 1
+                conn.execute(f'PRAGMA user_version = {version}')
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return version
@@ -0,0 +1,183 @@
+# -- RESÚMENES DE VENTAS Y SERVICIOS --
+# resumen_ventas_dia y resumen_servicios_dia guardan totales por día y por
+# producto / tipo de servicio. Los mantienen triggers sobre ventas y
+# servicios (ver migraciones.py), así que se actualizan en la misma
+# transacción que cada venta o servicio. Los reportes leen solo estas tablas:
+# su costo depende de la cantidad de días y productos, no de cuántas ventas
+# se hicieron.
+
+from datetime import datetime, timedelta
+
+TABLAS_RESUMEN = '''
+CREATE TABLE IF NOT EXISTS resumen_ventas_dia (
+    dia TEXT NOT NULL,
+    producto_nombre TEXT NOT NULL,
+    cantidad INTEGER NOT NULL DEFAULT 0,
+    monto REAL NOT NULL DEFAULT 0,
+    operaciones INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (dia, producto_nombre)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS resumen_servicios_dia (
+    dia TEXT NOT NULL,
+    tipo TEXT NOT NULL,
+    cantidad INTEGER NOT NULL DEFAULT 0,
+    monto REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (dia, tipo)
+) WITHOUT ROWID;
+
+CREATE TRIGGER IF NOT EXISTS trg_ventas_resumen_alta AFTER INSERT ON ventas
+WHEN date(NEW.fecha) IS NOT NULL BEGIN
+    INSERT INTO resumen_ventas_dia (dia, producto_nombre, cantidad, monto, operaciones)
+    VALUES (date(NEW.fecha), NEW.producto_nombre, NEW.cantidad, NEW.monto_total, 1)
+    ON CONFLICT (dia, producto_nombre) DO UPDATE SET
+        cantidad = cantidad + excluded.cantidad,
+        monto = monto + excluded.monto,
+        operaciones = operaciones + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_ventas_resumen_baja AFTER DELETE ON ventas
+WHEN date(OLD.fecha) IS NOT NULL BEGIN
+    UPDATE resumen_ventas_dia SET
+        cantidad = cantidad - OLD.cantidad,
+        monto = monto - OLD.monto_total,
+        operaciones = operaciones - 1
+    WHERE dia = date(OLD.fecha) AND producto_nombre = OLD.producto_nombre;
+    DELETE FROM resumen_ventas_dia
+    WHERE dia = date(OLD.fecha) AND producto_nombre = OLD.producto_nombre AND operaciones <= 0;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_servicios_resumen_alta AFTER INSERT ON servicios
+WHEN date(NEW.fecha) IS NOT NULL BEGIN
+    INSERT INTO resumen_servicios_dia (dia, tipo, cantidad, monto)
+    VALUES (date(NEW.fecha), NEW.tipo, 1, NEW.monto)
+    ON CONFLICT (dia, tipo) DO UPDATE SET
+        cantidad = cantidad + 1,
+        monto = monto + excluded.monto;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_servicios_resumen_baja AFTER DELETE ON servicios
+WHEN date(OLD.fecha) IS NOT NULL BEGIN
+    UPDATE resumen_servicios_dia SET cantidad = cantidad - 1, monto = monto - OLD.monto
+    WHERE dia = date(OLD.fecha) AND tipo = OLD.tipo;
+    DELETE FROM resumen_servicios_dia
+    WHERE dia = date(OLD.fecha) AND tipo = OLD.tipo AND cantidad <= 0;
+END;
+'''
+
+# Agregados calculados desde las tablas crudas, con las mismas columnas que
+# los resúmenes. Los usan tanto la reconstrucción como el verificador.
+_VENTAS_CRUDAS = '''
+    SELECT date(fecha) AS dia, producto_nombre, SUM(cantidad) AS cantidad,
+           SUM(monto_total) AS monto, COUNT(*) AS operaciones
+    FROM ventas WHERE date(fecha) IS NOT NULL GROUP BY 1, 2
+'''
+_SERVICIOS_CRUDOS = '''
+    SELECT date(fecha) AS dia, tipo, COUNT(*) AS cantidad, SUM(monto) AS monto
+    FROM servicios WHERE date(fecha) IS NOT NULL GROUP BY 1, 2
+'''
+
+FORMATO_DIA = '%Y-%m-%d'
+DIAS_POR_DEFECTO = 30
+
+
+def recalcular_resumenes(conn):
+    """Rehace los resúmenes desde ventas y servicios. No maneja la transacción."""
+    conn.execute('DELETE FROM resumen_ventas_dia')
+    conn.execute('DELETE FROM resumen_servicios_dia')
+    conn.execute(f'INSERT INTO resumen_ventas_dia (dia, producto_nombre, cantidad, monto, operaciones) {_VENTAS_CRUDAS}')
+    conn.execute(f'INSERT INTO resumen_servicios_dia (dia, tipo, cantidad, monto) {_SERVICIOS_CRUDOS}')
+
+
+def reconstruir(conn):
+    """Reconstrucción completa (comando `flask reconstruir-resumenes`)."""
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        recalcular_resumenes(conn)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    ventas = conn.execute('SELECT COUNT(*) FROM resumen_ventas_dia').fetchone()[0]
+    servicios = conn.execute('SELECT COUNT(*) FROM resumen_servicios_dia').fetchone()[0]
+    return ventas, servicios
+
+
+def verificar(conn):
+    """Compara los resúmenes contra las tablas crudas.
+
+    Devuelve una lista de diferencias (vacía si todo coincide). Cada una dice
+    en qué tabla está y si la fila sobra en el resumen ('resumen') o falta
+    en él ('crudo'). Los montos se comparan redondeados a centavos.
+    """
+    chequeos = (
+        ('resumen_ventas_dia',
+         'SELECT dia, producto_nombre AS clave, cantidad, ROUND(monto, 2) AS monto FROM resumen_ventas_dia',
+         f'SELECT dia, producto_nombre AS clave, cantidad, ROUND(monto, 2) AS monto FROM ({_VENTAS_CRUDAS})'),
+        ('resumen_servicios_dia',
+         'SELECT dia, tipo AS clave, cantidad, ROUND(monto, 2) AS monto FROM resumen_servicios_dia',
+         f'SELECT dia, tipo AS clave, cantidad, ROUND(monto, 2) AS monto FROM ({_SERVICIOS_CRUDOS})'),
+    )
+    diferencias = []
+    for tabla, resumen, crudo in chequeos:
+        for origen, a, b in (('resumen', resumen, crudo), ('crudo', crudo, resumen)):
+            for fila in conn.execute(f'{a} EXCEPT {b}'):
+                diferencias.append({'tabla': tabla, 'origen': origen, **dict(fila)})
+    return diferencias
+
+
+def parsear_rango(desde, hasta):
+    """Valida ?desde=&hasta= (YYYY-MM-DD, ambos inclusive). Por defecto, los últimos 30 días."""
+    hoy = datetime.now()
+    hasta = hasta or hoy.strftime(FORMATO_DIA)
+    desde = desde or (hoy - timedelta(days=DIAS_POR_DEFECTO - 1)).strftime(FORMATO_DIA)
+    # Se devuelven normalizadas: '2026-1-5' pasa strptime pero no compara
+    # bien como texto contra los días 'YYYY-MM-DD' de los resúmenes
+    desde = datetime.strptime(desde, FORMATO_DIA)
+    hasta = datetime.strptime(hasta, FORMATO_DIA)
+    if desde > hasta:
+        raise ValueError('desde no puede ser posterior a hasta')
+    return desde.strftime(FORMATO_DIA), hasta.strftime(FORMATO_DIA)
+
+
+def totales(conn, desde, hasta, agrupar='dia'):
+    """Totales de ventas y servicios por día o por mes dentro del rango."""
+    largo = 7 if agrupar == 'mes' else 10
+    filas = conn.execute(f'''
+        SELECT periodo, SUM(ventas) AS ventas, SUM(unidades) AS unidades,
+               SUM(servicios) AS servicios, SUM(ventas) + SUM(servicios) AS total
+        FROM (
+            SELECT substr(dia, 1, {largo}) AS periodo, monto AS ventas, cantidad AS unidades, 0 AS servicios
+            FROM resumen_ventas_dia WHERE dia BETWEEN ?1 AND ?2
+            UNION ALL
+            SELECT substr(dia, 1, {largo}), 0, 0, monto
+            FROM resumen_servicios_dia WHERE dia BETWEEN ?1 AND ?2
+        )
+        GROUP BY periodo ORDER BY periodo
+    ''', (desde, hasta)).fetchall()
+    return [dict(f) for f in filas]
+
+
+ORDENES_TOP = ('monto', 'cantidad')
+
+
+def top_productos(conn, desde, hasta, limite=10, orden='monto'):
+    """Los `limite` productos más vendidos en el rango, por monto o por unidades."""
+    if orden not in ORDENES_TOP:
+        raise ValueError(f'orden debe ser uno de: {", ".join(ORDENES_TOP)}')
+    filas = conn.execute(f'''
+        SELECT producto_nombre, SUM(cantidad) AS cantidad, SUM(monto) AS monto
+        FROM resumen_ventas_dia WHERE dia BETWEEN ? AND ?
+        GROUP BY producto_nombre ORDER BY {orden} DESC LIMIT ?
+    ''', (desde, hasta, limite)).fetchall()
+    return [dict(f) for f in filas]
+
+
+def mix_servicios(conn, desde, hasta):
+    """Cantidad y monto por tipo de servicio en el rango."""
+    filas = conn.execute('''
+        SELECT tipo, SUM(cantidad) AS cantidad, SUM(monto) AS monto
+        FROM resumen_servicios_dia WHERE dia BETWEEN ? AND ?
+        GROUP BY tipo ORDER BY monto DESC
+    ''', (desde, hasta)).fetchall()
+    return [dict(f) for f in filas]
@@ -0,0 +1,174 @@
+# -- SINCRONIZACIÓN DE OPERACIONES OFFLINE --
+# La app móvil encola ventas, altas de productos y ediciones de stock
+# mientras no tiene conexión y las manda todas juntas a /api/sync. Cada
+# operación trae una clave única generada por el cliente: el resultado de
+# cada clave queda guardado en sync_operaciones, así que si la app reenvía
+# el lote (porque se cortó la respuesta) recibe el mismo resultado y nada se
+# aplica dos veces. Todo el lote se aplica en una sola transacción.
+
+import json
+import sqlite3
+
+import db
+import importacion
+import ventas
+
+TABLA_SYNC = '''
+CREATE TABLE IF NOT EXISTS sync_operaciones (
+    clave TEXT PRIMARY KEY,
+    tipo TEXT NOT NULL,
+    resultado TEXT NOT NULL,
+    fecha TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_sync_operaciones_fecha ON sync_operaciones(fecha);
+'''
+
+TIPOS = ('venta', 'alta', 'stock')
+
+MAX_OPERACIONES = 500
+
+MAX_LARGO_CLAVE = 100
+
+# Las claves más viejas que esto se borran: una cola offline no dura tanto
+DIAS_RETENCION = 30
+
+# Errores causados por los datos de una operación: se guardan como rechazo
+# de esa operación y el resto del lote sigue. Los demás (base bloqueada,
+# disco lleno) abortan el lote entero y la app lo reintenta igual.
+ERRORES_DE_DATOS = (sqlite3.IntegrityError, sqlite3.DataError, OverflowError, TypeError, ValueError)
+
+
+def _entero(valor):
+    try:
+        numero = int(valor)
+    except (TypeError, ValueError, OverflowError):
+        return None
+    return numero if db.ENTERO_MINIMO <= numero <= db.ENTERO_MAXIMO else None
+
+
+def _id_producto(valor, altas):
+    # Una venta o edición puede apuntar a un producto dado de alta offline
+    # usando la clave de esa alta como id
+    if isinstance(valor, str) and valor in altas:
+        return altas[valor]
+    return _entero(valor)
+
+
+def _entero_no_negativo(valor):
+    numero = _entero(valor)
+    return numero if numero is not None and numero >= 0 else None
+
+
+def _alta(conn, op):
+    try:
+        _, nombre, categoria, stock, precio, stock_minimo = importacion.validar_fila(dict(op, id=None))
+    except ValueError as e:
+        return {'ok': False, 'error': 'datos_invalidos', 'detalle': str(e)}
+    p = conn.execute('INSERT INTO productos (nombre, categoria, stock, precio, stock_minimo) '
+                     'VALUES (?, ?, ?, ?, ?) RETURNING id, stock',
+                     (nombre, categoria, stock, precio, stock_minimo)).fetchone()
+    return {'ok': True, 'id': p['id'], 'nombre': nombre, 'stock': p['stock']}
+
+
+def _editar_stock(conn, op, altas):
+    id_prod = _id_producto(op.get('id'), altas)
+    stock = _entero_no_negativo(op.get('stock'))
+    if id_prod is None or stock is None:
+        return {'ok': False, 'id': id_prod, 'error': 'datos_invalidos'}
+    if op.get('stock_minimo') is not None:
+        stock_minimo = _entero_no_negativo(op['stock_minimo'])
+        if stock_minimo is None:
+            return {'ok': False, 'id': id_prod, 'error': 'datos_invalidos'}
+        p = conn.execute('UPDATE productos SET stock = ?, stock_minimo = ? WHERE id = ? RETURNING nombre, stock',
+                         (stock, stock_minimo, id_prod)).fetchone()
+    else:
+        p = conn.execute('UPDATE productos SET stock = ? WHERE id = ? RETURNING nombre, stock',
+                         (stock, id_prod)).fetchone()
+    if p is None:
+        return {'ok': False, 'id': id_prod, 'error': 'no_existe'}
+    return {'ok': True, 'id': id_prod, 'nombre': p['nombre'], 'stock': p['stock']}
+
+
+def _aplicar(conn, op, altas):
+    tipo = op['tipo']
+    if tipo == 'venta':
+        id_prod = _id_producto(op.get('id'), altas)
+        cantidad = op.get('cantidad', 1)
+        if id_prod is None or _entero(cantidad) is None:
+            return {'ok': False, 'id': id_prod, 'error': 'datos_invalidos'}
+        return ventas.vender_producto(conn, id_prod, cantidad, transaccion=False)
+    if tipo == 'alta':
+        return _alta(conn, op)
+    return _editar_stock(conn, op, altas)
+
+
+def sincronizar(conn, operaciones):
+    """Aplica un lote de operaciones del cliente en una única transacción.
+
+    Cada operación es un dict con ``clave``, ``tipo`` ('venta', 'alta' o
+    'stock') y sus datos. Devuelve ``(resultados, stock)``: el resultado de
+    cada operación en el mismo orden (``repetida`` es True si la clave ya
+    se había procesado) y el stock actual de los productos involucrados.
+    Los rechazos de negocio (sin stock, datos inválidos) también quedan
+    guardados: reenviarlos devuelve el mismo rechazo.
+    """
+    # Se buscan de una vez las claves del lote y las de altas referenciadas como id
+    claves = [v for op in operaciones if isinstance(op, dict) for v in (op.get('clave'), op.get('id'))]
+    claves = sorted({c for c in claves if isinstance(c, str)})
+
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        guardados = {}
+        if claves:
+            marcas = ','.join('?' * len(claves))
+            for fila in conn.execute(f'SELECT clave, resultado FROM sync_operaciones WHERE clave IN ({marcas})',
+                                     claves):
+                guardados[fila['clave']] = json.loads(fila['resultado'])
+
+        # clave de alta -> id asignado, para las operaciones que la referencian
+        altas = {c: r['id'] for c, r in guardados.items() if r.get('tipo') == 'alta' and r['ok']}
+        propias = {op['clave'] for op in operaciones if isinstance(op, dict) and isinstance(op.get('clave'), str)}
+        guardados = {c: r for c, r in guardados.items() if c in propias}
+        resultados = []
+        for op in operaciones:
+            clave = op.get('clave') if isinstance(op, dict) else None
+            if not isinstance(clave, str) or not clave or len(clave) > MAX_LARGO_CLAVE:
+                resultados.append({'ok': False, 'clave': clave, 'error': 'sin_clave'})
+                continue
+            if clave in guardados:
+                resultados.append(dict(guardados[clave], repetida=True))
+                continue
+            if op.get('tipo') not in TIPOS:
+                resultado = {'ok': False, 'error': 'tipo_invalido'}
+            else:
+                # Cada operación en su savepoint: si falla por sus datos se
+                # deshace solo ella y queda registrada como rechazada
+                conn.execute('SAVEPOINT operacion')
+                try:
+                    resultado = _aplicar(conn, op, altas)
+                except ERRORES_DE_DATOS as e:
+                    conn.execute('ROLLBACK TO operacion')
+                    resultado = {'ok': False, 'error': 'datos_invalidos', 'detalle': str(e)}
+                conn.execute('RELEASE operacion')
+            resultado = dict(resultado, clave=clave, tipo=op.get('tipo'))
+            if resultado['tipo'] == 'alta' and resultado['ok']:
+                altas[clave] = resultado['id']
+            conn.execute('INSERT INTO sync_operaciones (clave, tipo, resultado) VALUES (?, ?, ?)',
+                         (clave, str(resultado['tipo']), json.dumps(resultado, ensure_ascii=False)))
+            guardados[clave] = resultado
+            resultados.append(dict(resultado, repetida=False))
+
+        ids = sorted({r['id'] for r in resultados if isinstance(r.get('id'), int)})
+        stock = []
+        if ids:
+            marcas = ','.join('?' * len(ids))
+            stock = [dict(p) for p in conn.execute(
+                f'SELECT id, nombre, stock, stock_minimo FROM productos WHERE id IN ({marcas}) ORDER BY id', ids)]
+        conn.execute("DELETE FROM sync_operaciones WHERE fecha < datetime('now', ?)",
+                     (f'-{DIAS_RETENCION} days',))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return resultados, stock
@@ -1,6 +1,27 @@
+import gzip
+import io
+import json
+import os
+import sqlite3
+import tempfile
+import threading
 import unittest
 from unittest.mock import patch, MagicMock
-from main import app, buscar_precio
+
+# Los tests usan una base temporal: main inicializa la base al importarse
+os.environ.setdefault('LIBRERIA_DB', os.path.join(tempfile.mkdtemp(), 'test_libreria.db'))
+
+import alertas
+import db
+import importacion
+import inventario
+import metricas
+import migraciones
+import reportes
+import sincronizacion
+import ventas
+from datetime import datetime
+from main import app, buscar_precio, conectar, rango_del_dia
 
 class TestBuscarPrecio(unittest.TestCase):
     def setUp(self):
@@ -58,5 +79,641 @@ class TestBuscarPrecio(unittest.TestCase):
             call_args = mock_render.call_args
             self.assertEqual(call_args[1]['resultados'], [])
 
+class TestConexiones(unittest.TestCase):
+    def test_conexion_persistente_por_hilo(self):
+        """conectar() reutiliza la conexión del hilo y close() no la cierra"""
+        conn = conectar()
+        conn.close()
+        otra = conectar()
+        self.assertIs(conn, otra)
+        self.assertEqual(otra.execute('SELECT 1').fetchone()[0], 1)
+
+    def test_pragmas_wal(self):
+        conn = conectar()
+        self.assertEqual(conn.execute('PRAGMA journal_mode').fetchone()[0], 'wal')
+        self.assertEqual(conn.execute('PRAGMA busy_timeout').fetchone()[0], db.BUSY_TIMEOUT_MS)
+
+    def test_close_descarta_transaccion_abierta(self):
+        conn = conectar()
+        conn.execute("INSERT INTO servicios (tipo, monto) VALUES ('Test', 1)")
+        self.assertTrue(conn.in_transaction)
+        conn.close()
+        self.assertFalse(conn.in_transaction)
+        self.assertEqual(conn.execute("SELECT COUNT(*) FROM servicios WHERE tipo = 'Test'").fetchone()[0], 0)
+
+class BaseConDatos(unittest.TestCase):
+    """Limpia las tablas y desactiva el login para probar rutas y API"""
+    def setUp(self):
+        app.config['TESTING'] = True
+        app.config['LOGIN_DISABLED'] = True
+        self.client = app.test_client()
+        conn = conectar()
+        conn.execute('DELETE FROM productos')
+        conn.execute('DELETE FROM ventas')
+        conn.execute('DELETE FROM servicios')
+        conn.execute('DELETE FROM resumen_ventas_dia')
+        conn.execute('DELETE FROM resumen_servicios_dia')
+        conn.execute('DELETE FROM alertas')
+        conn.execute('DELETE FROM sync_operaciones')
+        conn.commit()
+        conn.close()
+
+    def tearDown(self):
+        app.config['LOGIN_DISABLED'] = False
+
+    def crear_producto(self, nombre='Lápiz', stock=10, precio=100.0, categoria='Colegio', stock_minimo=2):
+        conn = conectar()
+        cur = conn.execute('INSERT INTO productos (nombre, categoria, stock, precio, stock_minimo) VALUES (?, ?, ?, ?, ?)',
+                           (nombre, categoria, stock, precio, stock_minimo))
+        conn.commit()
+        conn.close()
+        return cur.lastrowid
+
+    def stock_de(self, id_prod):
+        return conectar().execute('SELECT stock FROM productos WHERE id = ?', (id_prod,)).fetchone()[0]
+
+class TestVentas(BaseConDatos):
+    def test_vender_descuenta_stock(self):
+        id_prod = self.crear_producto(stock=5)
+        resp = self.client.post('/vender', data={'id': id_prod, 'cantidad': 3})
+        self.assertEqual(resp.status_code, 302)
+        self.assertEqual(self.stock_de(id_prod), 2)
+
+    def test_vender_sin_stock_no_modifica(self):
+        id_prod = self.crear_producto(stock=2)
+        resultado = ventas.vender_producto(conectar(), id_prod, 3)
+        self.assertFalse(resultado['ok'])
+        self.assertEqual(resultado['error'], 'sin_stock')
+        self.assertEqual(self.stock_de(id_prod), 2)
+
+    def test_venta_lote_resultados_por_linea(self):
+        a = self.crear_producto('Goma', stock=4, precio=50)
+        b = self.crear_producto('Regla', stock=1, precio=200)
+        resp = self.client.post('/api/ventas/lote', json={'items': [
+            {'id': a, 'cantidad': 3}, {'id': b, 'cantidad': 2}, {'id': 9999, 'cantidad': 1},
+            {'id': a, 'cantidad': 2}, {'id': b, 'cantidad': 1}]})
+        datos = resp.get_json()
+        self.assertEqual([r['ok'] for r in datos['resultados']], [True, False, False, False, True])
+        self.assertEqual(datos['resultados'][2]['error'], 'no_existe')
+        self.assertEqual(datos['total'], 350)
+        self.assertEqual(self.stock_de(a), 1)
+        self.assertEqual(self.stock_de(b), 0)
+
+    def test_venta_lote_body_invalido(self):
+        resp = self.client.post('/api/ventas/lote', json={'items': []})
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(self.client.post('/api/ventas/lote', json=[1]).status_code, 400)
+
+    def test_venta_lote_distingue_id_de_cantidad(self):
+        a = self.crear_producto('Goma', stock=4)
+        resultados = ventas.vender_lote(conectar(), [{'id': 'x', 'cantidad': 1}, {'cantidad': 1},
+                                                     {'id': a, 'cantidad': 0}])
+        self.assertEqual([r['error'] for r in resultados], ['id_invalido', 'id_invalido', 'cantidad_invalida'])
+
+    def test_venta_lote_numeros_fuera_de_rango(self):
+        a = self.crear_producto('Goma', stock=4)
+        cuerpo = '{"items": [{"id": %d, "cantidad": 1e400}, {"id": 100000000000000000000, "cantidad": 1}]}' % a
+        resp = self.client.post('/api/ventas/lote', data=cuerpo, content_type='application/json')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual([r['error'] for r in resp.get_json()['resultados']], ['cantidad_invalida', 'id_invalido'])
+        self.assertEqual(ventas.vender_producto(conectar(), a, 10 ** 20)['error'], 'cantidad_invalida')
+
+    def test_concurrencia_nunca_stock_negativo(self):
+        """Muchos hilos vendiendo el mismo producto no pueden sobrevender"""
+        id_prod = self.crear_producto(stock=50)
+        exitos = []
+
+        def cajero():
+            conn = conectar()
+            for _ in range(10):
+                if ventas.vender_producto(conn, id_prod, 1)['ok']:
+                    exitos.append(1)
+                if ventas.vender_lote(conn, [{'id': id_prod, 'cantidad': 1}])[0]['ok']:
+                    exitos.append(1)
+            db.cerrar_conexion()
+
+        hilos = [threading.Thread(target=cajero) for _ in range(12)]
+        for h in hilos:
+            h.start()
+        for h in hilos:
+            h.join()
+        self.assertEqual(len(exitos), 50)
+        self.assertEqual(self.stock_de(id_prod), 0)
+        vendidas = conectar().execute('SELECT SUM(cantidad) FROM ventas').fetchone()[0]
+        self.assertEqual(vendidas, 50)
+
+class TestHistorial(BaseConDatos):
+    def test_migraciones_aplicadas(self):
+        conn = conectar()
+        self.assertEqual(conn.execute('PRAGMA user_version').fetchone()[0], len(migraciones.MIGRACIONES))
+        self.assertEqual(migraciones.migrar(conn), len(migraciones.MIGRACIONES))
+
+    def test_rango_del_dia(self):
+        self.assertEqual(rango_del_dia('2025-12-31'), ('2025-12-31', '2026-01-01'))
+
+    def test_consulta_por_rango_usa_indice(self):
+        plan = conectar().execute('EXPLAIN QUERY PLAN SELECT * FROM ventas WHERE fecha >= ? AND fecha < ?',
+                                  rango_del_dia('2026-01-01')).fetchall()
+        self.assertIn('idx_ventas_fecha', ' '.join(r['detail'] for r in plan))
+
+    def test_api_historial_solo_hoy(self):
+        conn = conectar()
+        hoy = datetime.now().strftime('%Y-%m-%d')
+        conn.execute("INSERT INTO ventas (producto_nombre, cantidad, monto_total, fecha) VALUES ('Hoy', 1, 10, ?)",
+                     (hoy + ' 23:59:59',))
+        conn.execute("INSERT INTO ventas (producto_nombre, cantidad, monto_total, fecha) VALUES ('Ayer', 1, 10, '2000-01-01 10:00:00')")
+        conn.commit()
+        datos = self.client.get('/api/historial').get_json()
+        self.assertEqual([v['producto_nombre'] for v in datos], ['Hoy'])
+
+class TestReportes(BaseConDatos):
+    def cargar(self):
+        conn = conectar()
+        conn.executemany('INSERT INTO ventas (producto_nombre, cantidad, monto_total, fecha) VALUES (?, ?, ?, ?)', [
+            ('Lápiz', 2, 200, '2026-03-01 10:00:00'), ('Lápiz', 1, 100, '2026-03-01 18:00:00'),
+            ('Goma', 5, 250, '2026-03-02 09:00:00'), ('Regla', 1, 900, '2026-04-10 12:00:00')])
+        conn.executemany('INSERT INTO servicios (tipo, monto, fecha) VALUES (?, ?, ?)', [
+            ('Anillado', 500, '2026-03-01 11:00:00'), ('Fotocopia B/N', 50, '2026-03-02 11:00:00')])
+        conn.commit()
+
+    def test_triggers_mantienen_resumen(self):
+        self.cargar()
+        fila = conectar().execute(
+            "SELECT cantidad, monto, operaciones FROM resumen_ventas_dia WHERE dia = '2026-03-01' AND producto_nombre = 'Lápiz'").fetchone()
+        self.assertEqual(tuple(fila), (3, 300, 2))
+        self.assertEqual(reportes.verificar(conectar()), [])
+
+    def test_venta_real_actualiza_resumen(self):
+        id_prod = self.crear_producto('Cuaderno', stock=5, precio=1000)
+        ventas.vender_producto(conectar(), id_prod, 2)
+        self.assertEqual(conectar().execute(
+            "SELECT SUM(monto) FROM resumen_ventas_dia WHERE producto_nombre = 'Cuaderno'").fetchone()[0], 2000)
+
+    def test_verificar_detecta_y_reconstruir_corrige(self):
+        self.cargar()
+        conn = conectar()
+        conn.execute("UPDATE resumen_ventas_dia SET monto = 1 WHERE producto_nombre = 'Goma'")
+        conn.commit()
+        self.assertEqual(len(reportes.verificar(conn)), 2)
+        reportes.reconstruir(conn)
+        self.assertEqual(reportes.verificar(conn), [])
+
+    def test_api_totales_por_mes(self):
+        self.cargar()
+        datos = self.client.get('/api/reportes/totales?desde=2026-03-01&hasta=2026-04-30&agrupar=mes').get_json()
+        self.assertEqual([(p['periodo'], p['total']) for p in datos['periodos']], [('2026-03', 1100), ('2026-04', 900)])
+        self.assertEqual(datos['total'], 2000)
+
+    def test_api_top_productos(self):
+        self.cargar()
+        datos = self.client.get('/api/reportes/top_productos?desde=2026-03-01&hasta=2026-03-31&orden=cantidad&limite=1').get_json()
+        self.assertEqual(datos['productos'], [{'producto_nombre': 'Goma', 'cantidad': 5, 'monto': 250}])
+
+    def test_api_rango_invalido(self):
+        resp = self.client.get('/api/reportes/totales?desde=2026-05-01&hasta=2026-04-01')
+        self.assertEqual(resp.status_code, 400)
+
+    def test_api_fechas_sin_ceros(self):
+        self.cargar()
+        datos = self.client.get('/api/reportes/totales?desde=2026-3-1&hasta=2026-3-31').get_json()
+        self.assertEqual((datos['desde'], datos['hasta']), ('2026-03-01', '2026-03-31'))
+        self.assertEqual(datos['total'], 1100)
+
+    def test_api_top_productos_orden_invalido(self):
+        resp = self.client.get('/api/reportes/top_productos?orden=precio')
+        self.assertEqual(resp.status_code, 400)
+
+class TestBuscador(BaseConDatos):
+    def test_sin_acentos_y_prefijo(self):
+        self.crear_producto('Lápiz Negro HB')
+        self.crear_producto('Cuaderno Rayado', categoria='Papelería')
+        datos = self.client.get('/api/buscar?q=lapiz').get_json()
+        self.assertEqual([p['nombre'] for p in datos], ['Lápiz Negro HB'])
+        datos = self.client.get('/api/buscar?q=papeleria cua').get_json()
+        self.assertEqual([p['nombre'] for p in datos], ['Cuaderno Rayado'])
+
+    def test_triggers_sincronizan_indice(self):
+        id_prod = self.crear_producto('Goma Blanca')
+        conn = conectar()
+        conn.execute("UPDATE productos SET nombre = 'Tijera Escolar' WHERE id = ?", (id_prod,))
+        conn.commit()
+        self.assertEqual(self.client.get('/api/buscar?q=goma').get_json(), [])
+        self.assertEqual(len(self.client.get('/api/buscar?q=tijera').get_json()), 1)
+        conn.execute('DELETE FROM productos WHERE id = ?', (id_prod,))
+        conn.commit()
+        self.assertEqual(self.client.get('/api/buscar?q=tijera').get_json(), [])
+
+    def test_limite_y_sintaxis_fts_escapada(self):
+        for i in range(5):
+            self.crear_producto(f'Marcador {i}')
+        self.assertEqual(len(self.client.get('/api/buscar?q=marc&limite=3').get_json()), 3)
+        self.assertEqual(self.client.get('/api/buscar?q="marc" OR NEAR(').status_code, 200)
+        self.assertEqual(self.client.get('/api/buscar?q=').get_json(), [])
+
+class TestCatalogoApi(BaseConDatos):
+    def test_lista_completa_compatible(self):
+        self.crear_producto('Lápiz')
+        resp = self.client.get('/api/productos')
+        self.assertIsInstance(resp.get_json(), list)
+        self.assertIn('X-Catalogo-Version', resp.headers)
+        self.assertTrue(resp.headers['ETag'])
+
+    def test_etag_304_y_cambio_de_version(self):
+        id_prod = self.crear_producto('Lápiz', stock=5)
+        etag = self.client.get('/api/productos').headers['ETag']
+        resp = self.client.get('/api/productos', headers={'If-None-Match': etag})
+        self.assertEqual(resp.status_code, 304)
+        ventas.vender_producto(conectar(), id_prod, 1)
+        resp = self.client.get('/api/productos', headers={'If-None-Match': etag})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.get_json()[0]['stock'], 4)
+
+    def test_delta_since(self):
+        a = self.crear_producto('Goma')
+        b = self.crear_producto('Regla')
+        version = int(self.client.get('/api/productos').headers['X-Catalogo-Version'])
+        conn = conectar()
+        conn.execute('UPDATE productos SET precio = 5 WHERE id = ?', (a,))
+        conn.execute('DELETE FROM productos WHERE id = ?', (b,))
+        conn.commit()
+        datos = self.client.get(f'/api/productos?since={version}').get_json()
+        self.assertEqual([p['id'] for p in datos['productos']], [a])
+        self.assertEqual(datos['borrados'], [b])
+        self.assertEqual(datos['version'], version + 2)
+
+    def test_paginado_con_cursor(self):
+        ids = [self.crear_producto(f'Producto {i}') for i in range(5)]
+        datos = self.client.get('/api/productos?limit=2').get_json()
+        self.assertEqual([p['id'] for p in datos['productos']], ids[:2])
+        datos = self.client.get(f"/api/productos?limit=2&cursor={datos['siguiente_cursor']}").get_json()
+        self.assertEqual([p['id'] for p in datos['productos']], ids[2:4])
+        datos = self.client.get(f"/api/productos?limit=2&cursor={datos['siguiente_cursor']}").get_json()
+        self.assertEqual(datos['siguiente_cursor'], None)
+
+    def test_respuesta_gzip(self):
+        for i in range(50):
+            self.crear_producto(f'Cuaderno Rayado Tapa Dura {i}')
+        resp = self.client.get('/api/productos', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(resp.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(len(json.loads(gzip.decompress(resp.data))), 50)
+
+    def test_parametros_invalidos(self):
+        self.assertEqual(self.client.get('/api/productos?limit=0').status_code, 400)
+        self.assertEqual(self.client.get('/api/productos?since=abc').status_code, 400)
+
+class TestInventario(BaseConDatos):
+    def test_index_agrupa_por_categoria(self):
+        self.crear_producto('Lápiz', categoria='Colegio')
+        self.crear_producto('Taza', categoria='Bazar')
+        html = self.client.get('/').get_data(as_text=True)
+        self.assertIn('📦 Bazar', html)
+        self.assertIn('Lápiz', html)
+        self.assertLess(html.index('📦 Bazar'), html.index('📦 Colegio'))
+
+    def test_vista_reutilizada_hasta_que_cambia_la_version(self):
+        id_prod = self.crear_producto('Lápiz', stock=5)
+        primera = inventario.vista(conectar())
+        self.assertIs(inventario.vista(conectar()), primera)
+        ventas.vender_producto(conectar(), id_prod, 1)
+        segunda = inventario.vista(conectar())
+        self.assertIsNot(segunda, primera)
+        self.assertEqual(segunda.secciones['Colegio'][0]['stock'], 4)
+        self.assertIn('>\n                                    4\n', self.client.get('/').get_data(as_text=True))
+
+    def test_vista_parcheada_igual_a_reconstruida(self):
+        a = self.crear_producto('Lápiz', categoria='Colegio')
+        b = self.crear_producto('Taza', categoria='Bazar')
+        inventario.vista(conectar())
+        conn = conectar()
+        conn.execute("UPDATE productos SET categoria = 'Arte' WHERE id = ?", (a,))
+        conn.execute('DELETE FROM productos WHERE id = ?', (b,))
+        conn.commit()
+        c = self.crear_producto('Pincel', categoria='Arte')
+        parcheada = inventario.vista(conectar())
+        inventario.invalidar()
+        reconstruida = inventario.vista(conectar())
+        self.assertEqual(parcheada.secciones, reconstruida.secciones)
+        self.assertEqual(list(parcheada.secciones), ['Arte'])
+        self.assertEqual([p['id'] for p in parcheada.secciones['Arte']], [a, c])
+        self.assertEqual(parcheada.firmas, reconstruida.firmas)
+
+    def test_stock_bajo_usa_indice_parcial(self):
+        self.crear_producto('Goma', stock=1, stock_minimo=3)
+        self.crear_producto('Regla', stock=10, stock_minimo=3)
+        self.assertEqual([p['nombre'] for p in inventario.vista(conectar()).stock_bajo], ['Goma'])
+        plan = conectar().execute('EXPLAIN QUERY PLAN SELECT id FROM productos WHERE stock <= stock_minimo').fetchall()
+        self.assertIn('idx_productos_stock_bajo', ' '.join(r['detail'] for r in plan))
+
+    def test_secciones_diferidas_y_paginadas(self):
+        conn = conectar()
+        conn.executemany('INSERT INTO productos (nombre, categoria, stock, precio, stock_minimo) VALUES (?, ?, 10, 1, 0)',
+                         [(f'Sobre {i}', 'Papelería') for i in range(inventario.LIMITE_CARGA_COMPLETA + 1)])
+        conn.commit()
+        html = self.client.get('/').get_data(as_text=True)
+        self.assertIn('seccion-diferida', html)
+        self.assertNotIn('Sobre 0<', html)
+        resp = self.client.get('/inventario/seccion?categoria=Papelería&pagina=0')
+        self.assertEqual(resp.get_data(as_text=True).count('<tr'), inventario.PRODUCTOS_POR_PAGINA)
+        self.assertEqual(resp.headers['X-Siguiente-Pagina'], '1')
+        self.assertEqual(self.client.get('/inventario/seccion?categoria=Nada').status_code, 404)
+
+class TestImportacion(BaseConDatos):
+    def test_importar_csv_con_errores_por_fila(self):
+        id_existente = self.crear_producto('Viejo', stock=1)
+        cuerpo = ('nombre,categoria,stock,precio,stock_minimo,id\n'
+                  'Témpera Azul,Arte,10,500,2,\n'
+                  ',Arte,1,1,0,\n'
+                  'Pincel,Arte,diez,100,0,\n'
+                  f'Renombrado,Bazar,7,50,1,{id_existente}\n')
+        resp = self.client.post('/api/productos/importar', data=cuerpo.encode(), content_type='text/csv')
+        datos = resp.get_json()
+        self.assertEqual((datos['procesadas'], datos['importadas'], datos['con_error']), (4, 2, 2))
+        self.assertEqual([e['fila'] for e in datos['errores']], [3, 4])
+        fila = conectar().execute('SELECT nombre, stock FROM productos WHERE id = ?', (id_existente,)).fetchone()
+        self.assertEqual(tuple(fila), ('Renombrado', 7))
+
+    def test_importar_json_en_bloques_chicos(self):
+        productos = [{'nombre': f'Sobre {i}', 'stock': i, 'precio': 10} for i in range(25)]
+        texto = json.dumps(productos)
+        filas = importacion._filas_json(io.StringIO(texto))
+        with patch('importacion.TAM_LECTURA', 7):
+            resultado = importacion.importar(conectar(), filas, por_bloque=4)
+        self.assertEqual(resultado.importadas, 25)
+        self.assertEqual(conectar().execute('SELECT COUNT(*) FROM productos').fetchone()[0], 25)
+
+    def test_importar_ndjson_archivo_de_formulario(self):
+        cuerpo = b'{"nombre": "Goma", "stock": 3, "precio": 80}\nno es json\n'
+        resp = self.client.post('/api/productos/importar',
+                                data={'archivo': (io.BytesIO(cuerpo), 'catalogo.ndjson')},
+                                content_type='multipart/form-data')
+        datos = resp.get_json()
+        self.assertEqual((datos['importadas'], datos['con_error']), (1, 1))
+
+    def test_json_que_no_es_lista(self):
+        resp = self.client.post('/api/productos/importar', data=b'{"nombre": "x"}', content_type='application/json')
+        self.assertEqual(resp.status_code, 400)
+
+    def test_json_cortado_informa_lo_grabado(self):
+        productos = ', '.join(json.dumps({'nombre': f'Sobre {i}', 'stock': 1, 'precio': 10}) for i in range(5))
+        cuerpo = f'[{productos}, {{mal'.encode()
+        resp = self.client.post('/api/productos/importar', data=cuerpo, content_type='application/json')
+        datos = resp.get_json()
+        self.assertEqual(resp.status_code, 400)
+        self.assertIsNotNone(datos['error_fatal'])
+        self.assertEqual((datos['procesadas'], datos['importadas']), (5, 5))
+        self.assertEqual(conectar().execute('SELECT COUNT(*) FROM productos').fetchone()[0], 5)
+
+    def test_numeros_fuera_de_rango_son_errores_de_fila(self):
+        cuerpo = ('{"nombre": "A", "stock": 1e400, "precio": 1}\n'
+                  '{"nombre": "B", "stock": "100000000000000000000", "precio": 1}\n'
+                  '{"nombre": "C", "stock": 1, "precio": 1e400}\n'
+                  '{"nombre": "D", "stock": 1, "precio": 1}\n')
+        resp = self.client.post('/api/productos/importar?formato=ndjson', data=cuerpo.encode())
+        datos = resp.get_json()
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual((datos['importadas'], datos['con_error']), (1, 3))
+
+    def test_campo_csv_gigante_corta_con_conteo(self):
+        cuerpo = 'nombre,precio\nA,1\nB,1\n"' + 'x' * 200_000 + '",1\n'
+        resp = self.client.post('/api/productos/importar', data=cuerpo.encode(), content_type='text/csv')
+        datos = resp.get_json()
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(datos['importadas'], 2)
+        self.assertIn('field larger than field limit', datos['error_fatal'])
+
+    def test_comando_sale_con_error_si_se_corta(self):
+        ruta = os.path.join(tempfile.mkdtemp(), 'cortado.json')
+        with open(ruta, 'w') as f:
+            f.write('[{"nombre": "A", "precio": 1}, {mal')
+        resultado = app.test_cli_runner().invoke(args=['importar-catalogo', ruta])
+        self.assertEqual(resultado.exit_code, 1)
+
+    def test_error_fatal_despues_de_bloques_confirmados(self):
+        def filas():
+            for i in range(5):
+                yield i + 1, {'nombre': f'Sobre {i}', 'precio': 10}
+            raise ValueError('La lista JSON no está cerrada')
+        resultado = importacion.importar(conectar(), filas(), por_bloque=2)
+        self.assertEqual((resultado.importadas, resultado.error_fatal), (5, 'La lista JSON no está cerrada'))
+
+    def test_exportar_csv_y_ndjson(self):
+        for i in range(3):
+            self.crear_producto(f'Regla {i}')
+        csv_texto = ''.join(importacion.exportar(conectar(), 'csv', por_pagina=2))
+        lineas = csv_texto.strip().splitlines()
+        self.assertEqual(lineas[0], ','.join(importacion.COLUMNAS))
+        self.assertEqual(len(lineas), 4)
+        ndjson = self.client.get('/api/productos/exportar?formato=ndjson').get_data(as_text=True)
+        self.assertEqual([json.loads(l)['nombre'] for l in ndjson.splitlines()], ['Regla 0', 'Regla 1', 'Regla 2'])
+
+class TestAlertas(BaseConDatos):
+    def test_venta_que_cruza_el_minimo_genera_una_alerta(self):
+        id_prod = self.crear_producto('Goma', stock=4, stock_minimo=2)
+        conn = conectar()
+        ventas.vender_producto(conn, id_prod, 1)
+        self.assertEqual(alertas.alertas_desde(conn, 0), [])
+        ventas.vender_producto(conn, id_prod, 1)
+        ventas.vender_producto(conn, id_prod, 1)
+        lista = alertas.alertas_desde(conn, 0)
+        self.assertEqual([(a['producto_id'], a['stock']) for a in lista], [(id_prod, 2)])
+
+    def test_editar_genera_alerta(self):
+        id_prod = self.crear_producto('Regla', stock=10, stock_minimo=2)
+        self.client.post(f'/editar/{id_prod}', data={'nombre': 'Regla', 'precio': 1, 'stock': 1, 'stock_minimo': 2})
+        self.assertEqual(len(alertas.alertas_desde(conectar(), 0)), 1)
+
+    def test_api_alertas_since(self):
+        a = self.crear_producto('Goma', stock=3, stock_minimo=2)
+        b = self.crear_producto('Regla', stock=3, stock_minimo=2)
+        ventas.vender_producto(conectar(), a, 1)
+        primera = self.client.get('/api/alertas?since=0').get_json()
+        self.assertEqual(len(primera['alertas']), 1)
+        ventas.vender_producto(conectar(), b, 2)
+        datos = self.client.get(f"/api/alertas?since={primera['ultima']}").get_json()
+        self.assertEqual([x['nombre'] for x in datos['alertas']], ['Regla'])
+
+    def test_stream_sse(self):
+        id_prod = self.crear_producto('Goma', stock=3, stock_minimo=2)
+        ventas.vender_producto(conectar(), id_prod, 1)
+        with patch('alertas.INTERVALO_STREAM', 0.01), patch('alertas.DURACION_STREAM', 0.05):
+            resp = self.client.get('/api/alertas/stream?since=0')
+            cuerpo = resp.get_data(as_text=True)
+        self.assertEqual(resp.mimetype, 'text/event-stream')
+        self.assertIn('event: stock_bajo', cuerpo)
+        self.assertIn('"nombre": "Goma"', cuerpo)
+
+    def test_stream_requiere_login(self):
+        app.config['LOGIN_DISABLED'] = False
+        self.assertEqual(self.client.get('/api/alertas/stream').status_code, 401)
+
+    def test_index_no_abre_streams(self):
+        html = self.client.get('/').get_data(as_text=True)
+        self.assertNotIn('EventSource', html)
+        self.assertIn('/api/alertas?since=', html)
+
+    def test_index_avisa_solo_alertas_nuevas(self):
+        id_prod = self.crear_producto('Goma', stock=3, stock_minimo=2)
+        self.client.get('/')
+        ventas.vender_producto(conectar(), id_prod, 1)
+        self.assertIn('Quedan solo 2 de: Goma', self.client.get('/').get_data(as_text=True))
+        self.assertNotIn('Quedan solo 2 de: Goma', self.client.get('/').get_data(as_text=True))
+
+class TestMetricas(BaseConDatos):
+    def setUp(self):
+        super().setUp()
+        metricas.registro.reiniciar()
+
+    def tearDown(self):
+        super().tearDown()
+        app.config['SERVER_TIMING'] = False
+
+    def test_latencia_y_consultas_por_endpoint(self):
+        self.crear_producto('Goma')
+        self.client.get('/api/productos')
+        texto = self.client.get('/metrics').get_data(as_text=True)
+        self.assertIn('libreria_pedido_duracion_segundos_count{endpoint="api_productos",metodo="GET"} 1', texto)
+        self.assertIn('libreria_pedidos_total{endpoint="api_productos",metodo="GET",status="200"} 1', texto)
+        consultas, _ = metricas.registro.sql['api_productos']
+        self.assertGreater(consultas, 0)
+
+    def test_tiempo_de_render(self):
+        self.client.get('/')
+        self.assertIn('index.html', metricas.registro.render)
+        self.assertIn('libreria_render_duracion_segundos_count{plantilla="index.html"} 1',
+                      self.client.get('/metrics').get_data(as_text=True))
+
+    def test_server_timing(self):
+        self.assertNotIn('Server-Timing', self.client.get('/api/productos').headers)
+        app.config['SERVER_TIMING'] = True
+        encabezado = self.client.get('/api/productos').headers['Server-Timing']
+        self.assertIn('sql;desc=', encabezado)
+        self.assertIn('total;dur=', encabezado)
+
+    def test_consulta_lenta_se_loguea(self):
+        with patch('metricas.UMBRAL_CONSULTA_LENTA', 0), self.assertLogs('libreria.sql', 'WARNING') as logs:
+            self.client.get('/api/productos')
+        self.assertIn('api_productos', logs.output[0])
+        self.assertGreater(metricas.registro.consultas_lentas, 0)
+
+    def test_bloqueos_se_cuentan(self):
+        metricas.observar_sql('UPDATE productos SET stock = 0', 0.0,
+                              sqlite3.OperationalError('database is locked'))
+        self.assertIn('libreria_sqlite_bloqueos_total 1', metricas.exportar())
+
+class TestSincronizacion(BaseConDatos):
+    def sync(self, *operaciones):
+        resp = self.client.post('/api/sync', json={'operaciones': list(operaciones)})
+        self.assertEqual(resp.status_code, 200)
+        return resp.get_json()
+
+    def test_aplica_venta_alta_y_stock(self):
+        goma = self.crear_producto('Goma', stock=10)
+        regla = self.crear_producto('Regla', stock=5)
+        datos = self.sync({'clave': 'a1', 'tipo': 'venta', 'id': goma, 'cantidad': 3},
+                          {'clave': 'a2', 'tipo': 'stock', 'id': regla, 'stock': 40},
+                          {'clave': 'a3', 'tipo': 'alta', 'nombre': 'Compás', 'categoria': 'Colegio',
+                           'stock': 7, 'precio': 900})
+        self.assertTrue(all(r['ok'] for r in datos['resultados']))
+        self.assertEqual(self.stock_de(goma), 7)
+        self.assertEqual(self.stock_de(regla), 40)
+        stock = {p['nombre']: p['stock'] for p in datos['stock']}
+        self.assertEqual(stock, {'Goma': 7, 'Regla': 40, 'Compás': 7})
+
+    def test_sin_sesion_se_rechaza(self):
+        app.config['LOGIN_DISABLED'] = False
+        goma = self.crear_producto('Goma', stock=10)
+        resp = self.client.post('/api/sync', json={'operaciones': [
+            {'clave': 's1', 'tipo': 'venta', 'id': goma, 'cantidad': 1}]})
+        self.assertEqual(resp.status_code, 401)
+        self.assertIn('error', resp.get_json())
+        self.assertEqual(self.stock_de(goma), 10)
+
+    def test_login_de_la_app_habilita_sync(self):
+        app.config['LOGIN_DISABLED'] = False
+        conn = conectar()
+        conn.execute("INSERT OR IGNORE INTO usuarios (username, password) VALUES ('caja', 'clave')")
+        conn.commit()
+        malo = self.client.post('/api/login', json={'usuario': 'caja', 'password': 'otra'})
+        self.assertEqual(malo.status_code, 401)
+        self.assertEqual(self.client.post('/api/login', json={'usuario': 'caja', 'password': 'clave'}).status_code, 200)
+        goma = self.crear_producto('Goma', stock=10)
+        datos = self.sync({'clave': 's1', 'tipo': 'venta', 'id': goma, 'cantidad': 1})
+        self.assertTrue(datos['resultados'][0]['ok'])
+
+    def test_numeros_fuera_de_rango_se_rechazan_sin_trabar_el_lote(self):
+        goma = self.crear_producto('Goma', stock=10)
+        grande = 100000000000000000000
+        cuerpo = json.dumps({'operaciones': [
+            {'clave': 'n1', 'tipo': 'alta', 'nombre': 'Mate', 'stock': grande, 'precio': 1},
+            {'clave': 'n2', 'tipo': 'venta', 'id': grande, 'cantidad': 1},
+            {'clave': 'n3', 'tipo': 'stock', 'id': goma, 'stock': grande},
+            {'clave': 'n4', 'tipo': 'venta', 'id': goma, 'cantidad': 2}]}).replace('"cantidad": 1}', '"cantidad": 1e400}')
+        resp = self.client.post('/api/sync', data=cuerpo, content_type='application/json')
+        self.assertEqual(resp.status_code, 200)
+        errores = [r.get('error') for r in resp.get_json()['resultados']]
+        self.assertEqual(errores, ['datos_invalidos', 'datos_invalidos', 'datos_invalidos', None])
+        self.assertEqual(self.stock_de(goma), 8)
+
+    def test_error_de_datos_de_una_operacion_no_aborta_el_lote(self):
+        goma = self.crear_producto('Goma', stock=10)
+        with patch('sincronizacion._alta', side_effect=sqlite3.IntegrityError('NOT NULL')):
+            datos = self.sync({'clave': 'a', 'tipo': 'alta', 'nombre': 'Mate'},
+                              {'clave': 'v', 'tipo': 'venta', 'id': goma, 'cantidad': 2})
+        self.assertEqual([r['ok'] for r in datos['resultados']], [False, True])
+        self.assertEqual(self.stock_de(goma), 8)
+        # El rechazo queda guardado: reenviarlo devuelve lo mismo
+        self.assertEqual(self.sync({'clave': 'a', 'tipo': 'alta', 'nombre': 'Mate'})['resultados'][0]['error'],
+                         'datos_invalidos')
+
+    def test_reenvio_no_duplica(self):
+        goma = self.crear_producto('Goma', stock=10)
+        operacion = {'clave': 'venta-1', 'tipo': 'venta', 'id': goma, 'cantidad': 4}
+        primera = self.sync(operacion)
+        segunda = self.sync(operacion)
+        self.assertFalse(primera['resultados'][0]['repetida'])
+        self.assertTrue(segunda['resultados'][0]['repetida'])
+        self.assertEqual(segunda['resultados'][0]['stock'], 6)
+        self.assertEqual(self.stock_de(goma), 6)
+        ventas_hechas = conectar().execute('SELECT COUNT(*) FROM ventas').fetchone()[0]
+        self.assertEqual(ventas_hechas, 1)
+
+    def test_venta_de_producto_dado_de_alta_offline(self):
+        datos = self.sync({'clave': 'alta-1', 'tipo': 'alta', 'nombre': 'Mate', 'stock': 5, 'precio': 3000},
+                          {'clave': 'venta-1', 'tipo': 'venta', 'id': 'alta-1', 'cantidad': 2})
+        id_mate = datos['resultados'][0]['id']
+        self.assertEqual(datos['resultados'][1]['id'], id_mate)
+        self.assertEqual(self.stock_de(id_mate), 3)
+        # Una operación posterior puede seguir usando la clave del alta
+        self.sync({'clave': 'venta-2', 'tipo': 'venta', 'id': 'alta-1', 'cantidad': 1})
+        self.assertEqual(self.stock_de(id_mate), 2)
+
+    def test_rechazos_no_frenan_el_lote(self):
+        goma = self.crear_producto('Goma', stock=1)
+        datos = self.sync({'clave': 'x1', 'tipo': 'venta', 'id': goma, 'cantidad': 5},
+                          {'tipo': 'venta', 'id': goma, 'cantidad': 1},
+                          {'clave': 'x3', 'tipo': 'borrar', 'id': goma},
+                          {'clave': 'x4', 'tipo': 'alta', 'nombre': ''},
+                          {'clave': 'x5', 'tipo': 'venta', 'id': goma, 'cantidad': 1})
+        errores = [r.get('error') for r in datos['resultados']]
+        self.assertEqual(errores, ['sin_stock', 'sin_clave', 'tipo_invalido', 'datos_invalidos', None])
+        self.assertEqual(self.stock_de(goma), 0)
+
+    def test_error_inesperado_revierte_todo(self):
+        goma = self.crear_producto('Goma', stock=10)
+        conn = conectar()
+        with patch('sincronizacion._alta', side_effect=sqlite3.DatabaseError('disco lleno')):
+            with self.assertRaises(sqlite3.DatabaseError):
+                sincronizacion.sincronizar(conn, [{'clave': 'v', 'tipo': 'venta', 'id': goma, 'cantidad': 2},
+                                                  {'clave': 'a', 'tipo': 'alta', 'nombre': 'Mate'}])
+        self.assertEqual(self.stock_de(goma), 10)
+        self.assertEqual(conn.execute('SELECT COUNT(*) FROM sync_operaciones').fetchone()[0], 0)
+
+    def test_valida_el_pedido(self):
+        self.assertEqual(self.client.post('/api/sync', json={}).status_code, 400)
+        self.assertEqual(self.client.post('/api/sync', json=[1]).status_code, 400)
+        with patch('sincronizacion.MAX_OPERACIONES', 1):
+            resp = self.client.post('/api/sync', json={'operaciones': [{}, {}]})
+        self.assertEqual(resp.status_code, 400)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
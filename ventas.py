@@ -0,0 +1,133 @@
+# -- MOTOR DE VENTAS --
+# El stock se descuenta con un UPDATE condicional (WHERE stock >= cantidad)
+# dentro de una transacción BEGIN IMMEDIATE: si dos cajas venden el último
+# producto al mismo tiempo, una de las dos no encuentra fila para actualizar
+# y la venta se rechaza, en lugar de dejar el stock en negativo.
+
+import db
+
+# Tope de líneas por carrito para /api/ventas/lote
+MAX_LINEAS_LOTE = 500
+
+
+def _entero(valor):
+    # None si no es un número entero que SQLite pueda guardar (1e400 o
+    # 10**20 llegan bien por JSON pero no entran en un INTEGER)
+    try:
+        numero = int(valor)
+    except (TypeError, ValueError, OverflowError):
+        return None
+    return numero if db.ENTERO_MINIMO <= numero <= db.ENTERO_MAXIMO else None
+
+
+def _cantidad_valida(valor):
+    cant = _entero(valor)
+    return cant if cant is not None and cant > 0 else None
+
+
+def vender_producto(conn, id_prod, cant, transaccion=True):
+    """Vende `cant` unidades de un producto.
+
+    Devuelve un dict con ``ok`` y, según el caso, ``nombre``, ``total`` y
+    ``stock`` restante o ``error`` ('id_invalido', 'cantidad_invalida',
+    'no_existe', 'sin_stock'). Con ``transaccion=False`` no abre ni confirma la
+    transacción (la maneja quien llama).
+    """
+    if _entero(id_prod) is None:
+        return {'ok': False, 'id': None, 'error': 'id_invalido'}
+    cant = _cantidad_valida(cant)
+    if cant is None:
+        return {'ok': False, 'id': id_prod, 'error': 'cantidad_invalida'}
+
+    if transaccion:
+        conn.execute('BEGIN IMMEDIATE')
+    try:
+        filas = conn.execute('UPDATE productos SET stock = stock - ? WHERE id = ? AND stock >= ? '
+                             'RETURNING nombre, precio, stock', (cant, id_prod, cant)).fetchall()
+        if filas:
+            p = filas[0]
+            total_venta = p['precio'] * cant
+            conn.execute('INSERT INTO ventas (producto_nombre, cantidad, monto_total) VALUES (?, ?, ?)',
+                         (p['nombre'], cant, total_venta))
+            resultado = {'ok': True, 'id': id_prod, 'nombre': p['nombre'], 'cantidad': cant,
+                         'total': total_venta, 'stock': p['stock']}
+        else:
+            p = conn.execute('SELECT nombre, stock FROM productos WHERE id = ?', (id_prod,)).fetchone()
+            if p is None:
+                resultado = {'ok': False, 'id': id_prod, 'error': 'no_existe'}
+            else:
+                resultado = {'ok': False, 'id': id_prod, 'nombre': p['nombre'],
+                             'error': 'sin_stock', 'stock': p['stock']}
+        if transaccion:
+            conn.commit()
+    except Exception:
+        if transaccion:
+            conn.rollback()
+        raise
+    return resultado
+
+
+def vender_lote(conn, items):
+    """Vende un carrito completo en una única transacción.
+
+    `items` es una lista de dicts ``{'id': ..., 'cantidad': ...}``. Las líneas
+    válidas se confirman juntas; las que no tienen stock o no existen se
+    informan con su error ('id_invalido', 'cantidad_invalida', 'no_existe',
+    'sin_stock') y no afectan al resto. Devuelve la lista de
+    resultados en el mismo orden que `items`.
+    """
+    lineas = []
+    for item in items:
+        id_prod = _entero(item.get('id')) if isinstance(item, dict) else None
+        cant = _cantidad_valida(item.get('cantidad', 1)) if isinstance(item, dict) else None
+        lineas.append((id_prod, cant))
+
+    ids = sorted({id_prod for id_prod, cant in lineas if id_prod is not None})
+
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        # Con BEGIN IMMEDIATE ya tenemos el lock de escritura: nadie puede
+        # cambiar el stock entre esta lectura y los UPDATE de abajo.
+        productos = {}
+        if ids:
+            marcas = ','.join('?' * len(ids))
+            for p in conn.execute(f'SELECT id, nombre, precio, stock FROM productos WHERE id IN ({marcas})', ids):
+                productos[p['id']] = {'nombre': p['nombre'], 'precio': p['precio'], 'stock': p['stock']}
+
+        resultados = []
+        descuentos = []
+        registros = []
+        for id_prod, cant in lineas:
+            if id_prod is None:
+                resultados.append({'ok': False, 'id': None, 'error': 'id_invalido'})
+                continue
+            if cant is None:
+                resultados.append({'ok': False, 'id': id_prod, 'error': 'cantidad_invalida'})
+                continue
+            p = productos.get(id_prod)
+            if p is None:
+                resultados.append({'ok': False, 'id': id_prod, 'error': 'no_existe'})
+                continue
+            if p['stock'] < cant:
+                resultados.append({'ok': False, 'id': id_prod, 'nombre': p['nombre'],
+                                   'error': 'sin_stock', 'stock': p['stock']})
+                continue
+            p['stock'] -= cant
+            total_venta = p['precio'] * cant
+            descuentos.append((cant, id_prod, cant))
+            registros.append((p['nombre'], cant, total_venta))
+            resultados.append({'ok': True, 'id': id_prod, 'nombre': p['nombre'], 'cantidad': cant,
+                               'total': total_venta, 'stock': p['stock']})
+
+        if descuentos:
+            cur = conn.executemany('UPDATE productos SET stock = stock - ? WHERE id = ? AND stock >= ?',
+                                   descuentos)
+            if cur.rowcount != len(descuentos):
+                raise RuntimeError('El stock cambió durante la venta en lote')
+            conn.executemany('INSERT INTO ventas (producto_nombre, cantidad, monto_total) VALUES (?, ?, ?)',
+                             registros)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return resultados